@@ -0,0 +1,167 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import stat
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli  # Optional: .br variants are only generated when installed
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST = "dist"
+MANIFEST = "manifest.json"
+
+# Only text-like assets are worth precompressing; PNGs are already compressed
+COMPRESSIBLE = {".css", ".js", ".html", ".svg", ".ico", ".json", ".txt"}
+# Text assets whose /static/... references get rewritten to hashed names
+REWRITABLE = {".css", ".js", ".html"}
+
+# Hashed files never change, so browsers may keep them for a year without revalidating
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+# Build step: content-hashed copies plus .gz/.br variants and a manifest
+def build(static_dir=STATIC_DIR):
+    dist_dir = os.path.join(static_dir, DIST)
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    os.makedirs(dist_dir)
+
+    names = sorted(
+        name for name in os.listdir(static_dir)
+        if os.path.isfile(os.path.join(static_dir, name))
+    )
+    # Binary assets first so stylesheets/scripts can reference their hashed names
+    names.sort(key=lambda name: os.path.splitext(name)[1] in REWRITABLE)
+
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_dir, name), "rb") as f:
+            content = f.read()
+        root, ext = os.path.splitext(name)
+        if ext in REWRITABLE:
+            content = _rewrite_references(content, manifest)
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        hashed = f"{root}.{digest}{ext}"
+        _write(os.path.join(dist_dir, hashed), content)
+        if ext in COMPRESSIBLE:
+            _write(os.path.join(dist_dir, hashed + ".gz"), gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(os.path.join(dist_dir, hashed + ".br"), brotli.compress(content))
+        manifest[name] = f"{DIST}/{hashed}"
+
+    with open(os.path.join(dist_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+def _write(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _rewrite_references(content, manifest):
+    def replace(match):
+        name = match.group(1).decode()
+        return b"/static/" + manifest[name].encode() if name in manifest else match.group(0)
+
+    return re.sub(rb"/static/([\w.\-]+)", replace, content)
+
+
+def load_manifest(static_dir=STATIC_DIR):
+    try:
+        with open(os.path.join(static_dir, DIST, MANIFEST), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+_manifest = load_manifest()
+
+# Jinja2 helper: {{ asset_url('index.css') }} -> /static/dist/index.<hash>.css
+def asset_url(name):
+    return "/static/" + _manifest.get(name, name)
+
+
+def accepts_encoding(header, encoding):
+    """Whether an Accept-Encoding header allows `encoding`: listed (or covered by `*`) with q > 0."""
+    wildcard = None
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == encoding:
+            return q > 0
+        if name == "*":
+            wildcard = q > 0
+    return bool(wildcard)
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that serves precompressed variants and long-lived cache headers.
+
+    Requests for a file whose .br/.gz sibling exists get that sibling (when the client
+    accepts it) with the original content type. Hashed files under dist/ are marked
+    immutable; everything else must be revalidated through its ETag.
+    """
+
+    async def get_response(self, path, scope):
+        response = None
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        if scope["method"] in ("GET", "HEAD"):
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if not accepts_encoding(accept, encoding):
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.file_response(full_path, stat_result, scope)
+                    if response.status_code == 200:
+                        response.headers["content-type"] = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                        response.headers["content-encoding"] = encoding
+                    break
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["vary"] = "Accept-Encoding"
+        response.headers["cache-control"] = IMMUTABLE if path.startswith(DIST + "/") else REVALIDATE
+        return response
+
+
+class PageCache:
+    """Renders templates without dynamic content once and serves them from memory with an ETag."""
+
+    def __init__(self, templates):
+        self.templates = templates
+        self.pages = {}
+
+    def response(self, request, name):
+        page = self.pages.get(name)
+        if page is None:
+            body = self.templates.get_template(name).render(request=request).encode("utf-8")
+            page = self.pages[name] = (body, '"' + hashlib.sha256(body).hexdigest()[:16] + '"')
+        body, etag = page
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html", headers=headers)
+
+
+if __name__ == "__main__":
+    for name, hashed in build().items():
+        print(f"{name} -> {hashed}")
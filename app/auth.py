@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from app import models, schemas
+from app import models, schemas, crud
 from app.database import SessionLocal
 from app.config import settings
+from app.services.availability import availability
 
 # Create an instance of CryptContext for password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -43,12 +45,16 @@ def get_user(db: Session, username: str):
 
 def register_user(db: Session, username: str, password: str) -> bool:
     """Adds a new user to the database"""
-    existing_user = db.query(models.User).filter(models.User.username == username).first()
-    if existing_user:
+    # Names the availability filter has never seen skip the lookup; the unique constraint still decides
+    if availability.may_exist(username) and get_user(db, username):
         return False  # User already exists
-    new_user = models.User(username=username, hashed_password=get_password_hash(password))
-    db.add(new_user)
-    db.commit()
+    try:
+        crud.create_user(db, username, None, password)  # Also updates the availability filter and search index
+    except IntegrityError:
+        db.rollback()
+        if get_user(db, username):
+            return False  # Registered concurrently, or by another process
+        raise
     return True
 
 def authenticate_user(db: Session, username: str, password: str) -> Optional[str]:
@@ -0,0 +1,108 @@
+import json
+import platform
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from app.bench.harness import configure_environment
+
+cli = typer.Typer()
+console = Console()
+
+# Metrics where a larger value is a regression (everything else: smaller is worse)
+LOWER_IS_BETTER = {"p50_ms", "p95_ms", "p99_ms", "cpu_s", "rss_mb"}
+COMPARED = ["rps", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of (scenario, metric, baseline, current, change, regressed)."""
+    rows = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric in COMPARED:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            rows.append((name, metric, old, new, change, regressed))
+    return rows
+
+
+@cli.command()
+def run(
+    scenario: Optional[List[str]] = typer.Option(None, help="Scenario to run (repeatable); default: all"),
+    users: int = typer.Option(10000, help="Seeded users for DB-backed scenarios"),
+    requests: int = typer.Option(200, help="HTTP requests per scenario"),
+    concurrency: int = typer.Option(20, help="Concurrent HTTP requests"),
+    clients: int = typer.Option(200, help="WebSocket clients for ws_fanout"),
+    subprotocol: Optional[str] = typer.Option(None, help="WebSocket subprotocol for ws_fanout (e.g. ms.struct)"),
+    targets: int = typer.Option(500, help="Fake servers for monitor_sweep"),
+    iterations: int = typer.Option(5, help="Repetitions for job/sweep scenarios"),
+    workers: int = typer.Option(4, help="Most monitor_worker processes for distributed_monitor"),
+    latency: float = typer.Option(0.0, help="Fake HTTP server response delay (seconds)"),
+    loss: float = typer.Option(0.0, help="Fake HTTP server request loss probability"),
+    flap_period: float = typer.Option(3.0, help="Fake server up/down period for outage_detection"),
+    duration: float = typer.Option(10.0, help="Run time of outage_detection (seconds)"),
+    out: Optional[str] = typer.Option(None, help="Write results JSON to this file"),
+    baseline: Optional[str] = typer.Option(None, help="Compare against a previous results JSON"),
+    tolerance: float = typer.Option(0.10, help="Allowed relative change before flagging a regression"),
+):
+    """Runs benchmark scenarios against a throwaway SQLite database and local stand-ins."""
+    db_path = configure_environment()
+    from app.bench.scenarios import SCENARIOS
+
+    names = scenario or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise typer.BadParameter(f"Unknown scenario(s): {', '.join(unknown)}. Available: {', '.join(SCENARIOS)}")
+
+    options = {
+        "users": users, "requests": requests, "concurrency": concurrency, "clients": clients,
+        "subprotocol": subprotocol, "targets": targets, "iterations": iterations, "workers": workers,
+        "latency": latency, "loss": loss, "flap_period": flap_period, "duration": duration,
+    }
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "database": db_path,
+            "options": options,
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        console.print(f"Running {name}...")
+        results["scenarios"][name] = SCENARIOS[name](options)
+
+    output = json.dumps(results, indent=4)
+    if out:
+        with open(out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if baseline:
+        with open(baseline, "r") as f:
+            rows = compare(results, json.load(f), tolerance)
+        table = Table(title=f"Baseline comparison (tolerance {tolerance:.0%})")
+        for column in ("Scenario", "Metric", "Baseline", "Current", "Change"):
+            table.add_column(column)
+        for name, metric, old, new, change, regressed in rows:
+            style = "red" if regressed else "green"
+            table.add_row(name, metric, str(old), str(new), f"[{style}]{change:+.1%}[/{style}]")
+        console.print(table)
+        if any(row[-1] for row in rows):
+            console.print("[red]Regression detected[/red]")
+            raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import random
+import socket
+import time
+
+from app.services import udpquery
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+HTTP_RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nOK"
+MAPS = ("de_dust2", "cp_badlands", "ctf_2fort", "dm_lockdown", "koth_harvest")
+
+
+class FakeServer:
+    """One loopback listener with scripted behaviour.
+
+    - latency/jitter: delay (seconds) before an HTTP or udpquery response is sent
+    - loss: probability that an HTTP request or udpquery query is swallowed (the probe times out)
+    - flap_period: the listener closes/reopens every flap_period seconds (connection refused while down)
+    - slow_accept: delay between accept() calls on a backlog of 1, so bursts of connects stall
+    - up=False: the listener starts closed
+
+    TCP connects on loopback are completed by the kernel, so latency and loss only
+    affect HTTP and udpquery targets; TCP targets are shaped with flapping and slow accept.
+    A udpquery server answers game-server queries (app.services.udpquery) with a player
+    count that drifts between queries.
+    """
+
+    def __init__(self, method="http", latency=0.0, jitter=0.0, loss=0.0, flap_period=None,
+                 slow_accept=0.0, up=True, rng=None):
+        self.method = method
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.flap_period = flap_period
+        self.slow_accept = slow_accept
+        self.rng = rng or random.Random()
+        self.port = None
+        self.sock = None
+        self.up = False
+        self.initially_up = up
+        self.transitions = []  # (monotonic time, up) whenever the listener opens or closes
+        if method == "udpquery":
+            # Game state: slots, a drifting player count and the current map
+            self.max_players = self.rng.choice((16, 24, 32, 64))
+            self.players = self.rng.randint(0, self.max_players)
+            self.map = self.rng.choice(MAPS)
+        self._tasks = []
+        self._handlers = set()  # Strong references, or pending handlers get garbage collected
+
+    def target(self, host="127.0.0.1"):
+        """The servers.json entry for this listener."""
+        return {"host": host, "method": self.method, "port": self.port}
+
+    async def start(self, apply_initial_state=True):
+        self._open()
+        if apply_initial_state and not self.initially_up:
+            self._close()
+        if self.flap_period:
+            self._tasks.append(asyncio.create_task(self._flap()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        self._close()
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    def _open(self):
+        udp = self.method == "udpquery"
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if udp else socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("127.0.0.1", self.port or 0))
+        except OSError:
+            sock.close()
+            raise
+        if not udp:
+            sock.listen(1 if self.slow_accept else 128)
+        sock.setblocking(False)
+        self.sock = sock
+        self.port = sock.getsockname()[1]
+        self.up = True
+        self.transitions.append((time.monotonic(), True))
+        # Plain reader callbacks (not loop.sock_accept) so closing never races a pending accept
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_datagram if udp else self._on_accept, sock)
+
+    def _close(self):
+        if self.sock is None:
+            return
+        asyncio.get_running_loop().remove_reader(self.sock.fileno())
+        self.sock.close()
+        self.sock = None
+        self.up = False
+        self.transitions.append((time.monotonic(), False))
+
+    async def _flap(self):
+        # Random phase so the farm doesn't flap in lockstep
+        await asyncio.sleep(self.rng.uniform(0, self.flap_period))
+        while True:
+            if self.up:
+                self._close()
+            else:
+                try:
+                    self._open()
+                except OSError:
+                    pass  # Port briefly taken by a client socket; retry on the next flip
+            await asyncio.sleep(self.flap_period)
+
+    def _on_accept(self, sock):
+        try:
+            conn, _ = sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        if self.method == "http":
+            task = asyncio.create_task(self._serve_http(conn))
+            self._handlers.add(task)
+            task.add_done_callback(self._handlers.discard)
+        else:
+            conn.close()
+        if self.slow_accept:
+            # Stop accepting for a while; further connects pile up in the backlog of 1
+            loop = asyncio.get_running_loop()
+            loop.remove_reader(sock.fileno())
+            loop.call_later(self.slow_accept, self._resume_accept, sock)
+
+    def _on_datagram(self, sock):
+        # udpquery responder: answers each query with a scripted player count and map
+        while True:
+            try:
+                data, addr = sock.recvfrom(512)
+            except OSError:  # Drained (BlockingIOError) or closed
+                return
+            request_id = udpquery.decode_query(data)
+            if request_id is None or self.rng.random() < self.loss:
+                continue
+            self.players = min(max(self.players + self.rng.randint(-2, 2), 0), self.max_players)
+            response = udpquery.encode_response(request_id, self.players, self.max_players, self.map)
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            if delay:
+                asyncio.get_running_loop().call_later(delay, self._send_datagram, sock, response, addr)
+            else:
+                self._send_datagram(sock, response, addr)
+
+    def _send_datagram(self, sock, data, addr):
+        if self.sock is sock:
+            try:
+                sock.sendto(data, addr)
+            except OSError:
+                pass
+
+    def _resume_accept(self, sock):
+        if self.sock is sock:
+            asyncio.get_running_loop().add_reader(sock.fileno(), self._on_accept, sock)
+
+    async def _serve_http(self, conn):
+        reader, writer = await asyncio.open_connection(sock=conn)
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            if self.rng.random() < self.loss:
+                await reader.read()  # Swallow the request until the client gives up
+                return
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(HTTP_RESPONSE)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class FakeServerFarm:
+    """Thousands of in-process loopback servers with a deterministic mix of behaviours.
+
+    Fractions pick which servers get each behaviour; `seed` makes the assignment and all
+    random latencies/losses reproducible.
+    """
+
+    def __init__(self, count, method="http", latency=0.0, jitter=0.0, loss=0.0,
+                 flap_period=None, flap_fraction=0.0, down_fraction=0.0,
+                 slow_accept=0.0, slow_fraction=0.0, seed=0):
+        self.rng = random.Random(seed)
+        methods = method.split(",")
+        self.servers = []
+        for i in range(count):
+            rng = random.Random(self.rng.random())
+            self.servers.append(FakeServer(
+                method=methods[i % len(methods)],
+                latency=latency,
+                jitter=jitter,
+                loss=loss,
+                flap_period=flap_period if rng.random() < flap_fraction else None,
+                slow_accept=slow_accept if rng.random() < slow_fraction else 0.0,
+                up=rng.random() >= down_fraction,
+                rng=rng,
+            ))
+
+    async def start(self):
+        raise_fd_limit(len(self.servers) * 4)
+        # Open everything before closing the start-down servers, so a freed port can't be
+        # handed to another fake server and every target stays unique
+        for server in self.servers:
+            await server.start(apply_initial_state=False)
+        for server in self.servers:
+            if not server.initially_up:
+                server._close()
+        return self
+
+    async def stop(self):
+        for server in self.servers:
+            await server.stop()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def targets(self):
+        return [server.target() for server in self.servers]
+
+    def write_servers_json(self, path="servers.json"):
+        """Writes a servers.json matching the farm, for running ms_app against it."""
+        with open(path, "w") as f:
+            json.dump(self.targets(), f, indent=4)
+
+
+def raise_fd_limit(wanted):
+    """Lifts the soft open-file limit towards `wanted` (up to the hard limit)."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+if __name__ == "__main__":
+    import typer
+
+    def main(
+        count: int = typer.Option(1000, help="Number of fake servers"),
+        method: str = typer.Option("http", help="Probe method(s), comma separated (http,tcp,udpquery)"),
+        latency: float = typer.Option(0.0, help="HTTP/udpquery response delay in seconds"),
+        jitter: float = typer.Option(0.0, help="Extra random HTTP/udpquery delay in seconds"),
+        loss: float = typer.Option(0.0, help="Probability an HTTP request or udpquery query is swallowed"),
+        flap_period: float = typer.Option(0.0, help="Seconds between up/down flips for flapping servers"),
+        flap_fraction: float = typer.Option(0.0, help="Fraction of servers that flap"),
+        down_fraction: float = typer.Option(0.0, help="Fraction of servers that start down"),
+        slow_accept: float = typer.Option(0.0, help="Delay between accepts for slow servers"),
+        slow_fraction: float = typer.Option(0.0, help="Fraction of servers that accept slowly"),
+        seed: int = typer.Option(0, help="Random seed"),
+        servers_json: str = typer.Option("servers.json", help="Where to write the matching target list"),
+    ):
+        """Runs a fake server farm on loopback until interrupted."""
+        async def run():
+            farm = FakeServerFarm(count, method, latency, jitter, loss, flap_period or None, flap_fraction,
+                                  down_fraction, slow_accept, slow_fraction, seed)
+            async with farm:
+                farm.write_servers_json(servers_json)
+                print(f"{count} fake servers listening on 127.0.0.1; targets written to {servers_json}")
+                await asyncio.Event().wait()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+
+    typer.run(main)
@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Password used for every seeded user; hashed once so seeding stays fast
+BENCH_PASSWORD = "bench-password"
+
+
+def configure_environment(db_path=None):
+    """Points the app at a throwaway SQLite database with background jobs disabled.
+
+    Must be called before any app module is imported, since app.database builds its
+    engine at import time.
+    """
+    # Same setup as the test harness, but on a file: load needs a real connection pool, and
+    # worker subprocesses share the database
+    from app.testing import configure_environment as configure
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="ms-bench-"), "bench.db")
+    configure(f"sqlite:///{db_path}")
+    return db_path
+
+
+def rss_mb():
+    """Current resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # ru_maxrss is KiB on Linux, bytes on macOS (peak rather than current)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 2**10
+    return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects per-operation latencies plus wall/CPU time for one scenario run."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.extra = {}
+
+    def start(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+        return self
+
+    def add(self, seconds):
+        self.latencies.append(seconds)
+
+    @contextlib.contextmanager
+    def measure(self):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors += 1
+        else:
+            self.add(time.perf_counter() - started)
+
+    def summary(self, ops=None):
+        ops = len(self.latencies) if ops is None else ops
+        values = sorted(self.latencies)
+        rss = rss_mb()
+        ms = lambda value: round(value * 1000, 3) if value is not None else None
+        result = {
+            "ops": ops,
+            "errors": self.errors,
+            "elapsed_s": round(self.elapsed, 4),
+            "rps": round(ops / self.elapsed, 2) if self.elapsed else None,
+            "p50_ms": ms(percentile(values, 50)),
+            "p95_ms": ms(percentile(values, 95)),
+            "p99_ms": ms(percentile(values, 99)),
+            "max_ms": ms(values[-1] if values else None),
+            "cpu_s": round(self.cpu, 4),
+            "cpu_pct": round(100 * self.cpu / self.elapsed, 1) if self.elapsed else None,
+            "rss_mb": round(rss, 1) if rss is not None else None,
+        }
+        result.update(self.extra)
+        return result
+
+
+def seed_users(count, regions=None):
+    """Bulk-inserts `count` users (user0..userN) sharing BENCH_PASSWORD."""
+    from app.database import Base, engine
+    from app.models import User, VALID_REGIONS
+    from app.auth import get_password_hash
+    from datetime import datetime
+
+    Base.metadata.create_all(bind=engine)  # Scenarios that don't import app.main still need the table
+    regions = regions or VALID_REGIONS
+    hashed = get_password_hash(BENCH_PASSWORD)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.delete())
+        batch = []
+        for i in range(count):
+            batch.append({
+                "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": hashed,
+                "is_active": True, "region": regions[i % len(regions)], "ping": (i * 37) % 300,
+                "updated_at": now,
+            })
+            if len(batch) == 5000:
+                conn.execute(User.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(User.__table__.insert(), batch)
+
+
+@contextlib.contextmanager
+def serve(app, log_level="warning"):
+    """Runs `app` with uvicorn on a free loopback port in a background thread; yields the base URL."""
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level=log_level, timeout_graceful_shutdown=1)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+async def run_concurrently(total, concurrency, operation):
+    """Runs `operation(i)` for i in range(total) with at most `concurrency` in flight."""
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            await operation(i)
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
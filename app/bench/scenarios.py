@@ -0,0 +1,544 @@
+import asyncio
+import time
+
+from app.bench.harness import BENCH_PASSWORD, Recorder, run_concurrently, seed_users, serve
+
+# Each scenario takes the CLI options dict and returns a Recorder summary (plus extras).
+# App modules are imported lazily: harness.configure_environment() must run first.
+
+
+def login_storm(options):
+    """Concurrent POST /login with valid credentials (bcrypt-bound)."""
+    import httpx
+    from app.main import app
+
+    users = min(options["users"], 1000)
+    seed_users(users)
+    recorder = Recorder()
+
+    async def run(base):
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(base_url=f"http://{base}", limits=limits, timeout=60) as client:
+            async def login(i):
+                name = f"user{i % users}"
+                body = {"username": name, "email": f"{name}@example.com", "password": BENCH_PASSWORD}
+                with recorder.measure():
+                    response = await client.post("/login", json=body)
+                    response.raise_for_status()
+
+            recorder.start()
+            await run_concurrently(options["requests"], options["concurrency"], login)
+            recorder.stop()
+
+    with serve(app) as base:
+        asyncio.run(run(base))
+    return recorder.summary()
+
+
+def user_listing(options):
+    """Concurrent GET /users/ against a table of `users` rows."""
+    import httpx
+    from app.main import app
+
+    seed_users(options["users"])
+    recorder = Recorder()
+    recorder.extra["users"] = options["users"]
+
+    async def run(base):
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(base_url=f"http://{base}", limits=limits, timeout=120) as client:
+            async def list_users(i):
+                with recorder.measure():
+                    response = await client.get("/users/")
+                    response.raise_for_status()
+                    recorder.extra["response_bytes"] = len(response.content)
+
+            recorder.start()
+            await run_concurrently(options["requests"], options["concurrency"], list_users)
+            recorder.stop()
+
+    with serve(app) as base:
+        asyncio.run(run(base))
+    return recorder.summary()
+
+
+def user_serialization(options):
+    """Per-row cost of building a GET /users/ body for `users` rows: response_model path vs row tuples.
+
+    "legacy" is what FastAPI does for `response_model=list[UserResponse]`: load ORM objects,
+    validate each into a model, serialize, then json.dumps. "fast" is the current path:
+    select the columns as tuples and encode them with the precompiled TypeAdapter.
+    """
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from app import models, schemas
+    from app.database import SessionLocal
+    from app.routers import USER_COLUMNS
+
+    seed_users(options["users"])
+    field = create_model_field("Response_get_users", list[schemas.UserResponse], mode="serialization")
+
+    def legacy(db):
+        content = asyncio.run(serialize_response(field=field, response_content=db.query(models.User).all()))
+        return JSONResponse(content).body
+
+    def fast(db):
+        return schemas.dump_user_rows(db.query(*USER_COLUMNS).all())
+
+    recorder = Recorder()  # Latencies are the fast path; the legacy path is reported alongside
+    recorder.extra["users"] = options["users"]
+    with SessionLocal() as db:
+        rows = len(db.query(models.User.id).all())
+        recorder.start()
+        for name, build in (("legacy", legacy), ("fast", fast)):
+            build(db)  # Warm up
+            timings = []
+            for _ in range(options["iterations"]):
+                db.expunge_all()  # Don't let the identity map hide the ORM load cost
+                started = time.perf_counter()
+                body = build(db)
+                timings.append(time.perf_counter() - started)
+            if name == "fast":
+                recorder.latencies.extend(timings)
+            recorder.extra[f"{name}_us_per_row"] = round(sorted(timings)[len(timings) // 2] / rows * 1e6, 3)
+            recorder.extra[f"{name}_bytes"] = len(body)
+        recorder.stop()
+    recorder.extra["speedup"] = round(recorder.extra["legacy_us_per_row"] / recorder.extra["fast_us_per_row"], 2)
+    return recorder.summary()
+
+
+def _shard_write_worker(job):
+    # One writer process (like an API worker or the ping updater): `ops` region-filtered
+    # single-row UPDATEs, each its own transaction. Returns the per-write latencies.
+    import random
+    from datetime import datetime
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database import ShardRouter
+    from app.models import User, VALID_REGIONS
+
+    url, sharded, ops, per_region, seed = job
+    router = ShardRouter(url)
+    maker = router.sessionmaker if sharded else sessionmaker(bind=create_engine(url, connect_args={"timeout": 60}))
+    rng = random.Random(seed)
+    latencies = []
+    for i in range(ops):
+        region = VALID_REGIONS[(seed + i) % len(VALID_REGIONS)]
+        user_id = router.id_base(region) + rng.randint(1, per_region)
+        started = time.perf_counter()
+        with maker() as db:
+            db.query(User).filter(User.region == region, User.id == user_id).update(
+                {"ping": rng.randint(0, 300), "updated_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def shard_writes(options):
+    """Concurrent single-row ping updates from `concurrency` writer processes: one SQLite store vs one file per region.
+
+    Both stores hold the same `users` rows and get the same region-filtered UPDATEs, which
+    the shard router sends to that region's database only. SQLite allows one writer per
+    database, so the single store serializes every process on one lock.
+    """
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    from datetime import datetime
+    from sqlalchemy import create_engine
+    from app.database import Base, ShardRouter
+    from app.models import User, VALID_REGIONS
+
+    directory = tempfile.mkdtemp(prefix="ms-bench-shards-")
+    sharded_url = f"sqlite:///{directory}/users_{{region}}.db"
+    single_url = f"sqlite:///{directory}/single.db"
+    router = ShardRouter(sharded_url)
+    router.create_all(Base.metadata)
+    single = create_engine(single_url)
+    Base.metadata.create_all(bind=single)
+
+    per_region = max(options["users"] // len(VALID_REGIONS), 1)
+    now = datetime.utcnow()
+    for region in VALID_REGIONS:
+        base = router.id_base(region)
+        rows = [{
+            "id": base + i + 1, "username": f"user{base + i}", "email": f"user{base + i}@example.com",
+            "hashed_password": "x", "is_active": True, "region": region, "ping": 50, "updated_at": now,
+        } for i in range(per_region)]
+        for engine in (single, router.engines[region]):
+            with engine.begin() as conn:
+                conn.execute(User.__table__.insert(), rows)
+
+    writers = options["concurrency"]
+    ops = max(options["requests"] // writers, 1)
+
+    def run(url, sharded):
+        recorder = Recorder()
+        jobs = [(url, sharded, ops, per_region, seed) for seed in range(writers)]
+        with ProcessPoolExecutor(writers) as pool:
+            pool.submit(time.sleep, 0).result()  # Start the pool before timing
+            recorder.start()
+            for latencies in pool.map(_shard_write_worker, jobs):
+                recorder.latencies.extend(latencies)
+            recorder.stop()
+        return recorder
+
+    baseline = run(single_url, False)
+    recorder = run(sharded_url, True)  # The sharded run; the single-store run is reported alongside
+    single = baseline.summary()
+    recorder.extra.update({
+        "users": per_region * len(VALID_REGIONS),
+        "shards": len(VALID_REGIONS),
+        "writers": writers,
+        "single_rps": single["rps"],
+        "single_p95_ms": single["p95_ms"],
+    })
+    result = recorder.summary()
+    result["speedup"] = round(result["rps"] / single["rps"], 2) if single["rps"] else None
+    return result
+
+
+def replica_reads(options):
+    """Point reads by id while another thread rewrites every row on the primary (like
+    update_user_data): on the primary vs on a replica (a SQLite copy) through ReplicaSet."""
+    import random
+    import sqlite3
+    import threading
+    from datetime import datetime
+    from sqlalchemy import update
+    from app.database import ReplicaSet, SessionLocal, engine
+    from app.models import User
+
+    seed_users(options["users"])
+    replica_path = engine.url.database + ".replica"
+    with engine.connect() as conn, sqlite3.connect(replica_path) as target:
+        conn.connection.dbapi_connection.backup(target)
+    replicas = ReplicaSet([f"sqlite:///{replica_path}"])
+
+    stop = threading.Event()
+    writes = [0]
+
+    def writer():
+        while not stop.is_set():
+            with engine.begin() as conn:
+                conn.execute(update(User).values(updated_at=datetime.utcnow()))
+            writes[0] += 1
+
+    def run(session_factory):
+        recorder = Recorder()
+        rng = random.Random(7)
+        thread = threading.Thread(target=writer, daemon=True)
+        stop.clear()
+        thread.start()
+        recorder.start()
+        for _ in range(options["requests"]):
+            started = time.perf_counter()
+            try:
+                with session_factory() as db:
+                    db.get(User, rng.randint(1, options["users"]))
+            except Exception:
+                recorder.errors += 1
+            else:
+                recorder.add(time.perf_counter() - started)
+        recorder.stop()
+        stop.set()
+        thread.join()
+        return recorder
+
+    primary = run(SessionLocal).summary()
+    writes[0] = 0
+    recorder = run(replicas.session)
+    recorder.extra.update({
+        "users": options["users"],
+        "table_rewrites": writes[0],
+        "primary_p50_ms": primary["p50_ms"],
+        "primary_p95_ms": primary["p95_ms"],
+        "primary_errors": primary["errors"],
+    })
+    return recorder.summary()
+
+
+def user_search(options):
+    """/users/search index: load time from the seeded table, then prefix queries and incremental writes."""
+    import random
+    from app.services.search import UserSearchIndex
+
+    seed_users(options["users"])
+    index = UserSearchIndex()
+    recorder = Recorder()
+    started = time.perf_counter()
+    index.load()
+    recorder.extra.update({"users": options["users"], "load_s": round(time.perf_counter() - started, 3)})
+
+    rng = random.Random(11)
+    queries = [f"user{rng.randint(0, options['users'] - 1)}"[:rng.randint(2, 9)] for _ in range(options["requests"])]
+    recorder.start()
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, limit=20, offset=rng.choice((0, 0, 20)))
+        recorder.add(time.perf_counter() - started)
+    recorder.stop()
+
+    writes = []
+    for i in range(options["requests"]):
+        started = time.perf_counter()
+        index.upsert(10**9 + i, f"new{rng.random()}", f"new{i}@example.com")
+        writes.append(time.perf_counter() - started)
+    writes.sort()
+    recorder.extra["upsert_p95_ms"] = round(writes[int(len(writes) * 0.95)] * 1000, 3)
+    return recorder.summary()
+
+
+def ws_fanout(options):
+    """N WebSocket clients connect to /ws at once; latency is connect -> first user-list frame."""
+    import websockets
+    from app.main import app
+
+    seed_users(options["users"])
+    subprotocol = options.get("subprotocol")
+    recorder = Recorder()
+    recorder.extra.update({"clients": options["clients"], "subprotocol": subprotocol or "none", "frame_bytes": 0})
+
+    async def run(base):
+        async def client(i):
+            with recorder.measure():
+                async with websockets.connect(
+                    f"ws://{base}/ws",
+                    subprotocols=[subprotocol] if subprotocol else None,
+                    max_size=None,
+                    open_timeout=60,
+                ) as ws:
+                    frame = await asyncio.wait_for(ws.recv(), 60)
+                    recorder.extra["frame_bytes"] = len(frame)
+
+        recorder.start()
+        await asyncio.gather(*(client(i) for i in range(options["clients"])))
+        recorder.stop()
+
+    # Server-side handlers are still sleeping between pushes and get cancelled on shutdown
+    with serve(app, log_level="critical") as base:
+        asyncio.run(run(base))
+    return recorder.summary()
+
+
+def ping_update(options):
+    """Runs the scheduled whole-table user update job back to back."""
+    import contextlib
+    import io
+    from app.main import update_user_data
+
+    seed_users(options["users"])
+    recorder = Recorder()
+    recorder.extra["users"] = options["users"]
+    recorder.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(options["iterations"]):
+            with recorder.measure():
+                update_user_data()
+    recorder.stop()
+    return recorder.summary()
+
+
+def monitor_sweep(options, method="http,tcp", concurrency=None):
+    """Sweeps a fake server farm of `targets` loopback HTTP/TCP servers with the probe engine."""
+    from app.bench.farm import FakeServerFarm
+    from app.services.monitor import DEFAULT_CONCURRENCY, sweep
+
+    targets = options["targets"]
+    recorder = Recorder()
+    recorder.extra.update({"targets": targets, "latency_s": options["latency"], "loss": options["loss"]})
+
+    async def run():
+        farm = FakeServerFarm(targets, method=method, latency=options["latency"], loss=options["loss"], seed=1)
+        async with farm:
+            servers = farm.targets()
+            recorder.start()
+            for _ in range(options["iterations"]):
+                with recorder.measure():
+                    await sweep(servers, timeout=2, concurrency=concurrency or DEFAULT_CONCURRENCY)
+            recorder.stop()
+            recorder.extra["up"] = sum(server["status"] == "UP" for server in servers)
+
+    asyncio.run(run())
+    # Throughput is reported as probes per second rather than sweeps per second
+    return recorder.summary(ops=targets * options["iterations"])
+
+
+def udpquery_sweep(options):
+    """monitor_sweep over udpquery game servers: every query goes through one shared UDP socket,
+    so all targets can be in flight at once."""
+    return monitor_sweep(options, method="udpquery", concurrency=options["targets"])
+
+
+def outage_detection(options):
+    """Sweeps a flapping TCP farm back to back; latency is listener-down -> first sweep reporting DOWN."""
+    import time
+    from app.bench.farm import FakeServerFarm
+    from app.services.monitor import sweep
+
+    targets = options["targets"]
+    recorder = Recorder()
+    recorder.extra.update({"targets": targets, "flap_period_s": options["flap_period"]})
+
+    async def run():
+        farm = FakeServerFarm(targets, method="tcp", flap_period=options["flap_period"], flap_fraction=1.0, seed=2)
+        async with farm:
+            servers = farm.targets()
+            sweeps = []  # (started, finished, statuses)
+            recorder.start()
+            deadline = time.monotonic() + options["duration"]
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                await sweep(servers, timeout=1)
+                sweeps.append((started, time.monotonic(), [server["status"] for server in servers]))
+            recorder.stop()
+
+        missed = 0
+        last_sweep = sweeps[-1][0] if sweeps else 0
+        for index, fake in enumerate(farm.servers):
+            for down_at, up in fake.transitions:
+                # Outages that began after the last sweep started (including farm shutdown) can't be seen
+                if up or down_at >= last_sweep:
+                    continue
+                detected = next(
+                    (finished for started, finished, statuses in sweeps
+                     if started >= down_at and statuses[index] == "DOWN"),
+                    None,
+                )
+                if detected is None:
+                    missed += 1
+                else:
+                    recorder.add(detected - down_at)
+        recorder.extra.update({"sweeps": len(sweeps), "missed_outages": missed})
+
+    asyncio.run(run())
+    return recorder.summary()
+
+
+def alert_storm(options):
+    """Half of the farm is down: sweeps feed the alert manager, which posts to a slow local webhook."""
+    from app.bench.farm import FakeServerFarm
+    from app.bench.webhook import WebhookReceiver
+    from app.services.alerts import AlertManager, WebhookSink
+    from app.services.feed import server_key
+    from app.services.monitor import sweep
+
+    targets = options["targets"]
+    recorder = Recorder()
+    recorder.extra["targets"] = targets
+
+    async def run():
+        async with FakeServerFarm(targets, method="tcp", down_fraction=0.5, seed=4) as farm, \
+                WebhookReceiver(delay=0.5) as receiver:
+            alerts = AlertManager([WebhookSink(receiver.url)], failures=2, window=3, group_wait=0.2)
+            dispatcher = asyncio.create_task(alerts.run())
+            servers = farm.targets()
+            recorder.start()
+            for _ in range(options["iterations"]):
+                with recorder.measure():
+                    results = await sweep(servers, timeout=1)
+                    alerts.observe_sweep(servers, results, server_key)
+            recorder.stop()
+            await asyncio.sleep(2)  # Let the last grouped notification go out
+            dispatcher.cancel()
+            recorder.extra.update({
+                "down_targets": sum(not fake.up for fake in farm.servers),
+                "notifications": len(receiver.received),
+                "alerts": sum(len(n["firing"]) + len(n["repeat"]) + len(n["resolved"]) for n in receiver.received),
+            })
+
+    asyncio.run(run())
+    return recorder.summary(ops=targets * options["iterations"])
+
+
+def distributed_monitor(options):
+    """ms_app in distributed mode with 1..`workers` monitor_worker processes sharing a latency-bound farm.
+
+    Each worker probes its hash-ring share with at most `concurrency` probes in flight and
+    posts the results to the master; throughput is ingested probes per second per stage,
+    timed from the end of the first pass.
+    """
+    import json
+    import os
+    import secrets
+    import subprocess
+    import sys
+    import tempfile
+    import threading
+    from app.bench.farm import FakeServerFarm
+
+    targets, iterations = options["targets"], options["iterations"]
+    recorder = Recorder()
+    recorder.extra.update({"targets": targets, "latency_s": options["latency"], "concurrency": options["concurrency"]})
+
+    # The farm runs on its own loop so the master's event loop only serves ingest
+    farm = FakeServerFarm(targets, method="http", latency=options["latency"], seed=5)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(farm.start())
+    farm_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    farm_thread.start()
+
+    root = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="ms-bench-cluster-"))  # ms_app reads/writes servers.json in the cwd
+    try:
+        with open("servers.json", "w") as f:
+            json.dump(farm.targets(), f)
+        os.environ["MONITOR_DISTRIBUTED"] = "true"
+        os.environ.setdefault("MONITOR_WORKER_TOKEN", secrets.token_hex(16))  # Workers inherit it via env
+        from app import ms_app
+
+        env = dict(os.environ, PYTHONPATH=root)
+        with serve(ms_app.app) as address:
+            recorder.start()
+            for count in range(1, options["workers"] + 1):
+                names = [f"bench{count}-{i}" for i in range(count)]
+                for name in names:
+                    ms_app.workers.heartbeat(name)  # Settle the ring before the processes start probing
+                processes = [subprocess.Popen(
+                    [sys.executable, "-m", "app.monitor_worker", "--master", f"http://{address}",
+                     "--worker-id", name, "--interval", "0", "--passes", str(iterations),
+                     "--concurrency", str(options["concurrency"]), "--timeout", "5"],
+                    cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                ) for name in names]
+                # Time passes after the first one, so interpreter startup doesn't count against probing
+                first_pass = ms_app.ingest_stats["results"] + targets
+                while ms_app.ingest_stats["results"] < first_pass and any(p.poll() is None for p in processes):
+                    time.sleep(0.01)
+                before = ms_app.ingest_stats["results"]
+                started = time.perf_counter()
+                for process in processes:
+                    process.wait()
+                elapsed = time.perf_counter() - started
+                recorder.add(elapsed)
+                rate = (ms_app.ingest_stats["results"] - before) / elapsed
+                recorder.extra[f"workers_{count}_probes_per_s"] = round(rate, 1)
+            recorder.stop()
+    finally:
+        os.chdir(root)
+        loop.call_soon_threadsafe(loop.stop)
+        farm_thread.join(timeout=5)
+        loop.run_until_complete(farm.stop())
+        loop.close()
+
+    first = recorder.extra["workers_1_probes_per_s"]
+    last = recorder.extra[f"workers_{options['workers']}_probes_per_s"]
+    recorder.extra["scaling"] = round(last / first, 2) if first else None
+    recorder.extra["cpus"] = os.cpu_count()
+    return recorder.summary(ops=targets * (iterations - 1) * options["workers"])
+
+
+SCENARIOS = {
+    "login_storm": login_storm,
+    "user_listing": user_listing,
+    "user_serialization": user_serialization,
+    "replica_reads": replica_reads,
+    "user_search": user_search,
+    "ws_fanout": ws_fanout,
+    "ping_update": ping_update,
+    "shard_writes": shard_writes,
+    "monitor_sweep": monitor_sweep,
+    "udpquery_sweep": udpquery_sweep,
+    "outage_detection": outage_detection,
+    "alert_storm": alert_storm,
+    "distributed_monitor": distributed_monitor,
+}
@@ -11,6 +11,22 @@ class Settings:
     SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
     ALGORITHM = "HS256"  # JWT signing algorithm
     ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Token expiration time in minutes
+    # Log every SQL statement (noisy; disable for benchmarks)
+    SQL_ECHO = os.getenv("SQL_ECHO", "true").lower() == "true"
+    # Run the periodic background jobs (user data, ping updater, presence flush); disable for benchmarks/tests
+    BACKGROUND_JOBS = os.getenv("BACKGROUND_JOBS", "true").lower() == "true"
+    # Store users in one database per region (see database.ShardRouter)
+    SHARDED_STORAGE = os.getenv("SHARDED_STORAGE", "false").lower() == "true"
+    # Shard URL: "{region}" placeholder = one database each, otherwise one Postgres schema each
+    SHARD_URL = os.getenv("SHARD_URL", "sqlite:///./users_{region}.db")
+    # Read replicas of DATABASE_URL (comma separated); read-only endpoints use them (see database.ReplicaSet)
+    REPLICA_URLS = [url.strip() for url in os.getenv("REPLICA_URLS", "").split(",") if url.strip()]
+    # Replicas further behind the primary than this many seconds are skipped
+    REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+    # After a client's own write, its reads stay on the primary this long (read-your-writes)
+    READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+    # Create pg_trgm indexes for user search on startup (Postgres only; needs the extension)
+    SEARCH_TRIGRAM_INDEX = os.getenv("SEARCH_TRIGRAM_INDEX", "false").lower() == "true"
 
 # Create a settings instance with the loaded environment variables
 settings = Settings()
@@ -0,0 +1,58 @@
+from app.testing import configure_environment
+
+# Before any app module is imported: app.database builds its engine at import time
+configure_environment()
+
+import pytest
+
+from app.testing import api_client, load_app, transactional_session
+
+
+@pytest.fixture
+def db():
+    """Session inside a transaction that is rolled back after the test."""
+    with transactional_session() as session:
+        yield session
+
+
+@pytest.fixture
+def client(db):
+    """TestClient whose requests all use the test's `db` session."""
+    with api_client(db) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def shard_router(tmp_path):
+    """Region-sharded storage on one SQLite file per region under tmp_path."""
+    from app.database import Base, ShardRouter
+
+    load_app()  # Registers the models on Base.metadata
+    router = ShardRouter(f"sqlite:///{tmp_path}/users_{{region}}.db")
+    router.create_all(Base.metadata)
+    yield router
+    router._pool.shutdown()
+    for engine in router.engines.values():
+        engine.dispose()
+
+
+@pytest.fixture
+def sharded_db(shard_router):
+    with shard_router.sessionmaker() as session:
+        yield session
+
+
+@pytest.fixture
+def replica_set(tmp_path):
+    """ReplicaSet with a SQLite file as the primary and another as its (stale) replica."""
+    from sqlalchemy import create_engine
+    from app.database import Base, ReplicaSet
+
+    load_app()
+    primary = create_engine(f"sqlite:///{tmp_path}/primary.db", connect_args={"check_same_thread": False})
+    replicas = ReplicaSet([f"sqlite:///{tmp_path}/replica.db"], primary=primary)
+    for engine in (primary, *replicas.engines):
+        Base.metadata.create_all(bind=engine)
+    yield replicas
+    for engine in (primary, *replicas.engines):
+        engine.dispose()
@@ -1,38 +1,121 @@
+import heapq
+from itertools import islice
+from collections import Counter
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from app.models import User
+from app.database import scatter, stream, user_names_of
+from app.models import User, VALID_REGIONS
+from app.schemas import UserResponse
+from app.services.feed import user_feed
+from app.services.availability import availability
+from app.services.search import search_index
 from datetime import datetime
 from app.security import hash_password, verify_password  # Import functions for hashing and verifying passwords
 
-# Create a new user
-def create_user(db: Session, username: str, email: str, password: str, region: str = None):
+# Record a written user in the users change feed (bumps the collection version/ETag) and the search index
+def publish_user(db_user: User):
+    row = UserResponse.model_validate(db_user).model_dump(mode="json")
+    user_feed.record([{"op": "upsert", "key": row["id"], "row": row}])
+    search_index.upsert(db_user.id, db_user.username, db_user.email)
+
+# Record deleted users in the users change feed (one version bump for the whole batch) and the search index
+def publish_users_removed(user_ids: list[int]):
+    user_feed.record([{"op": "remove", "key": user_id} for user_id in user_ids])
+    search_index.remove(user_ids)
+
+# In sharded storage, move a user whose region changed to that region's shard
+def move_to_region_shard(db: Session, db_user: User):
+    router = db.info.get("shards")
+    if router is not None:
+        router.move(db, db_user)
+
+# In sharded storage, free the usernames/emails of users removed by a bulk delete (which
+# bypasses the session's own bookkeeping, see database.ShardRouter.claim)
+def release_user_names(db: Session, users):
+    router = db.info.get("shards")
+    if router is not None:
+        router.release(set().union(*(user_names_of(username, email) for username, email in users)))
+
+# Create a new user. Every path that adds users goes through here, so the availability
+# filter and the search index see them; without a region the user starts in the first one
+# with ping 0 until the client reports RTT samples (routers.report_region_samples)
+def create_user(db: Session, username: str, email: str | None, password: str, region: str = None, ping: int = 0):
     hashed_password = hash_password(password)  # Hash the password
-    db_user = User(username=username, email=email, password=hashed_password, region=region, updated_at=datetime.now())
+    db_user = User(username=username, email=email, hashed_password=hashed_password, region=region or VALID_REGIONS[0],
+                   ping=ping, updated_at=datetime.now())
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    availability.add(db_user.username, db_user.email)
+    publish_user(db_user)
     return db_user
 
 # Get a user by ID
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
 
-# Get all users with optional pagination
+# Get all users with optional pagination (ordered by id; pages are merged across shards)
 def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(User).offset(skip).limit(limit).all()
+    if db.info.get("shards") is None:
+        return db.query(User).offset(skip).limit(limit).all()
+    parts = scatter(db, lambda shard: shard.query(User).order_by(User.id).limit(skip + limit).all())
+    return list(islice(heapq.merge(*parts, key=lambda user: user.id), skip, skip + limit))
+
+# Count users matching `criteria` with one COUNT per shard (summed across shards)
+def count_users(db: Session, *criteria) -> int:
+    statement = select(func.count()).select_from(User).where(*criteria)
+    return sum(scatter(db, lambda shard: shard.execute(statement).scalar()))
+
+# Count users matching `criteria` per region
+def count_users_by_region(db: Session, *criteria) -> Counter:
+    statement = select(User.region, func.count()).where(*criteria).group_by(User.region)
+    totals = Counter()
+    for rows in scatter(db, lambda shard: shard.execute(statement).all()):
+        for region, count in rows:
+            totals[region] += count
+    return totals
+
+# Stream users matching `criteria` in id order from a server-side cursor, `batch` rows per
+# fetch (merged across shards), so exports hold one batch in memory rather than the table
+def stream_users(db: Session, columns, *criteria, batch: int = 1000):
+    statement = select(User.id, *columns).where(*criteria).order_by(User.id).execution_options(yield_per=batch)
+    return stream(db, statement, key=lambda row: row.id)
+
+# Delete the `count` least recently updated users; returns their ids
+def delete_oldest_users(db: Session, count: int) -> list[int]:
+    parts = scatter(db, lambda shard: shard.query(User.updated_at, User.id, User.username, User.email).order_by(User.updated_at.asc()).limit(count).all())
+    oldest = list(islice(heapq.merge(*parts), count))
+    user_ids = [user_id for _, user_id, _, _ in oldest]
+    if user_ids:
+        db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+        release_user_names(db, [(username, email) for _, _, username, email in oldest])
+        for _, _, username, email in oldest:
+            availability.remove(username, email)
+        publish_users_removed(user_ids)
+    return user_ids
 
 # Update user data
 def update_user(db: Session, user_id: int, username: str = None, email: str = None, region: str = None):
     db_user = db.query(User).filter(User.id == user_id).first()
     if db_user:
+        previous = (db_user.username, db_user.email)
         if username:
             db_user.username = username
         if email:
             db_user.email = email
         if region:
             db_user.region = region
+            move_to_region_shard(db, db_user)
         db_user.updated_at = datetime.now()
         db.commit()
         db.refresh(db_user)
+        # Only the values that changed, so an unchanged email's counters aren't churned by a rename
+        current = (db_user.username, db_user.email)
+        if current != previous:
+            availability.remove(*(old if old != new else None for old, new in zip(previous, current)))
+            availability.add(*(new if old != new else None for old, new in zip(previous, current)))
+        publish_user(db_user)
     return db_user
 
 # Delete a user
@@ -41,11 +124,13 @@ def delete_user(db: Session, user_id: int):
     if db_user:
         db.delete(db_user)
         db.commit()
+        availability.remove(db_user.username, db_user.email)
+        publish_users_removed([user_id])
     return db_user
 
 # Verify user password during login
 def verify_user_password(db: Session, username: str, password: str):
     user = db.query(User).filter(User.username == username).first()
-    if user and verify_password(password, user.password):  # Verify the password
+    if user and verify_password(password, user.hashed_password):  # Verify the password
         return user
     return None
@@ -1,6 +1,85 @@
 import tkinter as tk
 from tkinter import messagebox
 import json
+import os
+import queue
+import threading
+import time
+from app.services.feed import ChangeFeed, server_key
+from app.widgets import VirtualListbox
+
+try:
+    from websockets.exceptions import WebSocketException
+    from websockets.sync.client import connect as ws_connect  # Optional: live feed from ms_app
+except ImportError:
+    WebSocketException = None
+    ws_connect = None
+
+FEED_URL = os.getenv("MONITOR_FEED_URL", "ws://127.0.0.1:8000/ws/feed")
+# Delay before reconnecting to the feed: doubles after each failed attempt, up to the maximum (seconds)
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 30.0
+
+# Reads the monitor's WebSocket change feed until the connection closes; returns the number of events
+def follow_websocket_feed(events, url=FEED_URL):
+    received = 0
+    with ws_connect(url) as ws:
+        for message in ws:
+            events.put(json.loads(message))
+            received += 1
+    return received
+
+class FileFeed:
+    """servers.json as change events; the file is only re-parsed when it actually changed."""
+
+    def __init__(self, path="servers.json"):
+        self.path = path
+        self.feed = ChangeFeed()
+        self.mtime = None
+
+    def poll(self, snapshot=False):
+        """The rows changed since the last poll as an event (None if nothing did), or with
+        `snapshot` the whole file, for a list that was showing something else."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = 0
+        if mtime == self.mtime and not snapshot:
+            return None
+        self.mtime = mtime
+        try:
+            with open(self.path, "r") as f:
+                servers = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            servers = []
+        changes = self.feed.publish(servers)
+        if snapshot:
+            return self.feed.snapshot()
+        return {"version": self.feed.version, "changes": changes} if changes else None
+
+def follow_feed(events, url=FEED_URL, path="servers.json", interval=5, stop=None):
+    """Follows the monitor's live feed, reconnecting with backoff whenever it can't connect
+    or the connection drops (monitor restarted, network); servers.json is shown meanwhile."""
+    stop = stop or threading.Event()
+    files = FileFeed(path)
+    delay = RECONNECT_MIN
+    while not stop.is_set():
+        if ws_connect is not None:
+            try:
+                if follow_websocket_feed(events, url):
+                    delay = RECONNECT_MIN  # Was connected: the first retry comes quickly
+            except (OSError, WebSocketException, ValueError):
+                pass  # Monitor not running, restarted or sent garbage
+        # Watch the file until the next attempt; its first event replaces what the feed showed
+        deadline = time.monotonic() + delay if ws_connect is not None else float("inf")
+        snapshot = True
+        while not stop.is_set() and time.monotonic() < deadline:
+            event = files.poll(snapshot)
+            snapshot = False
+            if event:
+                events.put(event)
+            stop.wait(min(interval, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, RECONNECT_MAX)
 
 # Function to update the server list
 class ServerMonitorApp:
@@ -9,35 +88,49 @@ class ServerMonitorApp:
         self.root.title("Server Monitor")
         self.root.geometry("500x300")  # Window size
         self.root.config(bg="#2E3B4E")  # Background color (dark blue shade)
-        
-        self.server_list = tk.Listbox(root, bg="#3C4D6A", fg="white", font=("Helvetica", 12), selectmode=tk.SINGLE)
+
+        self.server_list = VirtualListbox(root, bg="#3C4D6A", fg="white", font=("Helvetica", 12), selectmode=tk.SINGLE)
         self.server_list.pack(padx=20, pady=20, fill=tk.BOTH, expand=True)
 
         # Adding buttons and label
         self.status_label = tk.Label(root, text="Server Status", fg="white", bg="#2E3B4E", font=("Helvetica", 16))
         self.status_label.pack(pady=10)
-        
+
         self.update_button = tk.Button(root, text="Update Status", command=self.update_servers, bg="#4E6A88", fg="white", font=("Helvetica", 12))
         self.update_button.pack(pady=10)
 
+        # Change events arrive from a background thread; the Tk thread applies them
+        self.events = queue.Queue()
+        threading.Thread(target=follow_feed, args=(self.events,), daemon=True).start()
+
         self.update_servers()
 
     def update_servers(self):
-        self.server_list.delete(0, tk.END)
-        
-        # Load data from the server (e.g., from a file)
+        # Apply only the rows that changed since the last event
         try:
-            with open("servers.json", "r") as f:
-                servers = json.load(f)
-        except FileNotFoundError:
-            servers = []
-        
-        # Add servers to Listbox
-        for server in servers:
-            self.server_list.insert(tk.END, f"{server['host']} - {server['method']}")
+            while True:
+                event = self.events.get_nowait()
+                if "snapshot" in event:
+                    self.server_list.clear()
+                    for server in event["snapshot"]:
+                        self.show_server(server)
+                for change in event.get("changes", []):
+                    if change["op"] == "upsert":
+                        self.show_server(change["row"])
+                    else:
+                        self.server_list.remove_row(change["key"])
+        except queue.Empty:
+            pass
+        self.status_label.config(text=f"Server Status ({len(self.server_list)} servers)")
+
+        # Check for new events again shortly
+        if getattr(self, "_pending", None):
+            self.root.after_cancel(self._pending)
+        self._pending = self.root.after(200, self.update_servers)
 
-        # Call the function again after 5 seconds
-        self.root.after(5000, self.update_servers)
+    def show_server(self, server):
+        color = {"UP": "#7CFC00", "DOWN": "#FF6347"}.get(server.get("status"))
+        self.server_list.set_row(server_key(server), f"{server['host']} - {server['method']}", color)
 
 def start_gui():
     root = tk.Tk()
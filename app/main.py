@@ -1,29 +1,71 @@
+import asyncio
+import csv
+import functools
+import time
+from itertools import islice
+import orjson
+import requests
 from dotenv import load_dotenv
 from datetime import datetime
 from fastapi import FastAPI, Request, Depends, HTTPException, WebSocket
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
-from app.database import get_db, engine, get_db_connection, SessionLocal
-from app.crud import create_user, get_user, get_users, update_user, delete_user
+from app.database import get_db, get_read_db, engine, SessionLocal, shards, replicas, PRIMARY_COOKIE, request_writes
+from app.crud import create_user, get_user, get_users, update_user, delete_user, count_users, delete_oldest_users, count_users_by_region, stream_users
 from app.models import User, Base
+from app.config import settings
 import uvicorn
 import typer
-from rich.console import Console
+from rich.console import Console, Group
+from rich.live import Live
 from rich.table import Table
 from app.routers import router  
+from app.assets import CachedStaticFiles, PageCache, asset_url
+from app.services.presence import presence, FLUSH_INTERVAL
+from app.services.availability import availability
+from app.services.search import search_index, create_trigram_indexes
+from app.services.jobs import JobRunner
+from app.update_users import update_users_info
+from app.services.feed import apply_event, user_feed
+from prometheus_client import REGISTRY
 from prometheus_fastapi_instrumentator import Instrumentator
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Create the FastAPI application
-app = FastAPI()
+# Background jobs run on the application's event loop (see the job registrations below)
+jobs = JobRunner()
+
+# Build the in-memory user indexes off the loop; until each is ready its lookups go to the database
+async def load_index(name, load):
+    try:
+        count = await asyncio.to_thread(load)
+        print(f"{name} loaded: {count} users.")
+    except Exception as e:
+        print(f"{name} not loaded: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The change feed and in-memory indexes are per process (see services.feed.ChangeFeed)
+    if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        print("Warning: WEB_CONCURRENCY > 1; ETags, ?since= deltas and long-polls need a single worker.")
+    loaders = [
+        asyncio.create_task(load_index("Availability filter", availability.load)),
+        asyncio.create_task(load_index("Search index", search_index.load)),
+    ]
+    if settings.BACKGROUND_JOBS:
+        await jobs.start()
+    yield
+    await jobs.stop()
+    for loader in loaders:
+        loader.cancel()
+
+# Create the FastAPI application (orjson for all JSON responses)
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Include routes from the 'router' module
 app.include_router(router)
@@ -44,9 +86,28 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Read-your-writes: after a request that committed something, the client's reads go to the
+# primary for a while (a cookie, so it holds across API processes)
+async def read_your_writes(request: Request, call_next):
+    writes = []
+    token = request_writes.set(writes)  # Seen by the endpoint's task and threadpool call
+    try:
+        response = await call_next(request)
+    finally:
+        request_writes.reset(token)
+    if writes and response.status_code < 400:
+        response.set_cookie(PRIMARY_COOKIE, f"{time.time() + settings.READ_YOUR_WRITES_SECONDS:.3f}",
+                            max_age=int(settings.READ_YOUR_WRITES_SECONDS) + 1, httponly=True, samesite="lax")
+    return response
+
+if replicas is not None:
+    app.middleware("http")(read_your_writes)
+
+# Mount static files (precompressed, hashed assets built by app/assets.py) and templates
+app.mount("/static", CachedStaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["asset_url"] = asset_url
+pages = PageCache(templates)  # Landing pages have no dynamic content, render them once
 
 # Favicon route
 @app.get("/favicon.ico")
@@ -56,46 +117,45 @@ async def favicon():
 # Root page (API home page)
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return pages.response(request, "index.html")
 
 # Login page route
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return pages.response(request, "login.html")
+
+# Active users page, rendered from the in-memory presence tracker (no database query)
+@app.get("/active_users", response_class=HTMLResponse)
+async def active_users_page(request: Request):
+    rows = [(username, seen.strftime("%Y-%m-%d %H:%M:%S")) for username, seen in presence.active()]
+    return templates.TemplateResponse(request, "active_users.html", {"active_users": rows})
 
 # Function to update user data
 def update_user_data():
     db = SessionLocal()
     try:
-        # Check the number of users
-        user_count = db.query(User).count()
+        # Check the number of users (across all shards in sharded mode)
+        user_count = count_users(db)
         if user_count >= 10000:
             # Delete older users if there are too many
-            users_to_delete = db.query(User).order_by(User.updated_at.asc()).limit(user_count - 9999).all()
-            for user in users_to_delete:
-                db.delete(user)
-            db.commit()
-        # Update the 'updated_at' timestamp for all users
+            delete_oldest_users(db, user_count - 9999)
+        # Update the 'updated_at' timestamp for all users (not part of the served user rows,
+        # so it doesn't bump the users collection version)
         db.query(User).update({"updated_at": datetime.now()})
         db.commit()
         print("Updated users data.")
     finally:
         db.close()
 
-# Set up background scheduler to update user data periodically
-scheduler = BackgroundScheduler()
-scheduler.add_job(update_user_data, 'interval', seconds=10)
-
-# Job listener to handle job execution events
-def job_listener(event):
-    if event.exception:
-        print(f"Job {event.job_id} failed")
-    else:
-        print(f"Job {event.job_id} succeeded")
+# Periodic jobs: at most one instance each, missed runs coalesced, blocking work on the job executor
+jobs.add(update_user_data, interval=10, jitter=1, timeout=30)
+jobs.add(update_users_info, interval=10, jitter=1, timeout=30)
+jobs.add(presence.flush, interval=FLUSH_INTERVAL, name="presence_flush", jitter=1, timeout=30)
+if replicas is not None:
+    jobs.add(functools.partial(replicas.check, user_feed), interval=5, name="replica_check", timeout=30)
 
-# Add job listener to the scheduler
-scheduler.add_listener(job_listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
-scheduler.start()
+# Job run counts and runtime histograms on the Prometheus endpoint
+REGISTRY.register(jobs)
 
 # API endpoints for user management
 @app.post("/users/")
@@ -103,14 +163,14 @@ def create_user_api(username: str, email: str, password: str, region: str = None
     return create_user(db=db, username=username, email=email, password=password, region=region)
 
 @app.get("/users/{user_id}")
-def get_user_api(user_id: int, db: Session = Depends(get_db)):
+def get_user_api(user_id: int, db: Session = Depends(get_read_db)):
     db_user = get_user(db=db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 @app.get("/users/")
-def get_users_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_users_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     return get_users(db=db, skip=skip, limit=limit)
 
 @app.put("/users/{user_id}")
@@ -127,8 +187,13 @@ def delete_user_api(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
-# Create all tables in the database
-Base.metadata.create_all(bind=engine)
+# Create all tables in the database (on every shard in sharded storage mode)
+if shards is not None:
+    shards.create_all(Base.metadata)
+else:
+    Base.metadata.create_all(bind=engine)
+    if settings.SEARCH_TRIGRAM_INDEX:
+        create_trigram_indexes(engine)
 
 # WebSocket support for real-time communication
 active_connections = []
@@ -150,33 +215,144 @@ async def websocket_endpoint(websocket: WebSocket):
 # Typer CLI for command-line interactions
 cli = typer.Typer()
 
-# CLI command to list users
+# Columns shown/exported by list_users (id is always first)
+CLI_COLUMNS = [User.username, User.email, User.region, User.ping, User.is_active, User.last_login, User.updated_at]
+CLI_FIELDS = ["id"] + [column.key for column in CLI_COLUMNS]
+
+def user_criteria(region, active, prefix, min_ping, max_ping, updated_since):
+    # WHERE clauses for the CLI filters (a region filter also pins sharded queries to one shard)
+    criteria = []
+    if region:
+        criteria.append(User.region == region)
+    if active is not None:
+        criteria.append(User.is_active == active)
+    if prefix:
+        criteria.append(User.username.startswith(prefix, autoescape=True))
+    if min_ping is not None:
+        criteria.append(User.ping >= min_ping)
+    if max_ping is not None:
+        criteria.append(User.ping <= max_ping)
+    if updated_since:
+        criteria.append(User.updated_at >= updated_since)
+    return criteria
+
+def cli_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+# CLI command to list users: streams the whole (filtered) table in id order
 @cli.command()
-def list_users():
-    db = get_db_connection()
-    users = get_users(db=db, skip=0, limit=100)
-    table = Table(title="User List")
-    table.add_column("ID", style="bold")
-    table.add_column("Username")
-    table.add_column("Region")
-    table.add_column("Last Updated")
-    
-    for user in users:
-        table.add_row(str(user.id), user.username, user.region, str(user.updated_at))
-    
-    console = Console()
-    console.print(table)
+def list_users(
+    region: str = typer.Option(None, help="Only users in this region"),
+    active: bool = typer.Option(None, "--active/--inactive", help="Only active or inactive users"),
+    prefix: str = typer.Option(None, help="Only usernames starting with this"),
+    min_ping: int = typer.Option(None, help="Minimum ping (ms)"),
+    max_ping: int = typer.Option(None, help="Maximum ping (ms)"),
+    updated_since: datetime = typer.Option(None, help="Only users updated at or after this time"),
+    format: str = typer.Option("table", help="table, csv or ndjson"),
+    limit: int = typer.Option(None, help="Stop after this many rows (table: 100 unless given)"),
+    batch: int = typer.Option(1000, help="Rows fetched per round trip"),
+):
+    if format not in ("table", "csv", "ndjson"):
+        raise typer.BadParameter("format must be table, csv or ndjson")
+    criteria = user_criteria(region, active, prefix, min_ping, max_ping, updated_since)
+    with SessionLocal() as db:
+        rows = stream_users(db, CLI_COLUMNS, *criteria, batch=batch)
+        if format == "table":
+            limit = limit or 100
+        rows = islice(rows, limit) if limit else rows
+        if format == "csv":
+            writer = csv.writer(sys.stdout)
+            writer.writerow(CLI_FIELDS)
+            for row in rows:
+                writer.writerow([cli_value(value) for value in row])
+            return
+        if format == "ndjson":
+            for row in rows:
+                sys.stdout.buffer.write(orjson.dumps(dict(zip(CLI_FIELDS, row)), default=str) + b"\n")
+            return
+        table = Table(title="User List")
+        table.add_column("ID", style="bold")
+        table.add_column("Username")
+        table.add_column("Region")
+        table.add_column("Ping")
+        table.add_column("Last Updated")
+        shown = 0
+        for user in rows:
+            table.add_row(str(user.id), user.username, user.region, str(user.ping), str(user.updated_at))
+            shown += 1
+        console = Console()
+        console.print(table)
+        total = count_users(db, *criteria)
+        if shown < total:
+            console.print(f"Showing {shown} of {total} users (--limit, or --format csv/ndjson to export all).")
+
+def fetch_servers(monitor, version=None, wait=25):
+    # Long-polls the monitor's /servers feed: (version, event), or (version, None) if nothing changed
+    params = {"since": version, "wait": wait} if version is not None else {}
+    response = requests.get(f"{monitor.rstrip('/')}/servers", params=params, timeout=wait + 10)
+    version = int(response.headers.get("X-Collection-Version", version or 0))
+    if response.status_code == 304:
+        return version, None
+    response.raise_for_status()
+    body = response.json()
+    return version, ({"snapshot": body} if isinstance(body, list) else body)
 
-# CLI command to check server status
+def status_view(user_total, regions, servers, rows):
+    table = Table(title=f"Monitor status ({datetime.now():%H:%M:%S})")
+    for column in ("Host", "Method", "Port", "Status", "Players"):
+        table.add_column(column)
+    # Problems first, then by host
+    ordered = sorted(servers.values(), key=lambda server: (server.get("status") != "DOWN", server["host"]))
+    for server in ordered[:rows]:
+        status = server.get("status") or "-"
+        color = {"UP": "green", "DOWN": "red"}.get(status, "white")
+        players = f"{server['players']}/{server['max_players']}" if server.get("players") is not None else ""
+        table.add_row(server["host"], server.get("method", "ping"), str(server.get("port", "")),
+                      f"[{color}]{status}[/{color}]", players)
+    up = sum(server.get("status") == "UP" for server in servers.values())
+    by_region = ", ".join(f"{region}: {count}" for region, count in sorted(regions.items()))
+    summary = f"Total users: {user_total} ({by_region})\nServers: {up}/{len(servers)} up"
+    if len(servers) > rows:
+        summary += f" (showing {rows})"
+    return Group(summary, table)
+
+# CLI command to check server status: true user counts plus the monitor's server list,
+# redrawn as the monitor publishes changes with --watch
 @cli.command()
-def server_status():
-    db = get_db_connection()
-    users = get_users(db=db, skip=0, limit=100)
+def server_status(
+    monitor: str = typer.Option(os.getenv("MONITOR_URL", "http://127.0.0.1:8000"), help="ms_app base URL"),
+    watch: bool = typer.Option(False, help="Keep the view open and update it live"),
+    rows: int = typer.Option(50, help="Servers shown (down ones first)"),
+):
+    with SessionLocal() as db:
+        regions = count_users_by_region(db)
+    user_total = sum(regions.values())
+    servers = {}
     console = Console()
-    console.print(f"Total users: {len(users)}")
-    for user in users:
-        console.print(f"{user.username} - {user.region}")
+    try:
+        version, event = fetch_servers(monitor)
+    except requests.RequestException as e:
+        console.print(f"Total users: {user_total}")
+        console.print(f"[red]Monitor unreachable at {monitor}: {e}[/red]")
+        raise typer.Exit(code=1)
+    apply_event(servers, event)
+    if not watch:
+        console.print(status_view(user_total, regions, servers, rows))
+        return
+    with Live(status_view(user_total, regions, servers, rows), console=console, auto_refresh=False) as live:
+        try:
+            while True:
+                try:
+                    version, event = fetch_servers(monitor, version)
+                except requests.RequestException:
+                    time.sleep(2)  # Monitor restarting; keep the last view and retry
+                    continue
+                if event is not None:
+                    apply_event(servers, event)
+                    live.update(status_view(user_total, regions, servers, rows), refresh=True)
+        except KeyboardInterrupt:
+            pass
 
 # Run the CLI
 if __name__ == "__main__":
-    typer.run(cli)
+    cli()
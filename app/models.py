@@ -1,17 +1,20 @@
 from sqlalchemy import Column, Integer, String, Boolean, DateTime
 from sqlalchemy import event
 from datetime import datetime
-from .database import Base
+from .database import Base, REGIONS
 
-# List of valid regions for the user
-VALID_REGIONS = ["EU", "US", "ASIA", "AFRICA", "OCEANIA"]
+# List of valid regions for the user (also the shard keys in sharded storage mode)
+VALID_REGIONS = REGIONS
 
 # User model representing the 'users' table in the database
 class User(Base):
     __tablename__ = "users"
+    # Monotonic ids on SQLite, so each shard's id range (database.ID_SPAN) can be seeded
+    __table_args__ = {"sqlite_autoincrement": True}
 
     # Defining columns for the user table
     id = Column(Integer, primary_key=True, index=True)
+    # Unique per database; across shards in sharded storage via database.user_names
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
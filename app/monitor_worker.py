@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+
+import requests
+import typer
+
+from app.services.feed import server_key
+from app.services.monitor import DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT, sweep
+
+# Monitor worker for distributed mode (ms_app with MONITOR_DISTRIBUTED=true).
+#
+# Each pass heartbeats the master, which answers with this worker's current share of
+# the targets (consistent hashing, so joins/leaves only move ~1/N of them), probes that
+# share with the async sweep engine and posts the results back in batches.
+#
+#   python -m app.monitor_worker --master http://127.0.0.1:8000 --worker-id w1
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+
+class MonitorWorker:
+    def __init__(self, master, worker_id, token=None, timeout=DEFAULT_TIMEOUT,
+                 concurrency=DEFAULT_CONCURRENCY, batch_size=1000):
+        self.master = master.rstrip("/")
+        self.worker_id = worker_id
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.http = requests.Session()
+        if token:
+            self.http.headers["Authorization"] = f"Bearer {token}"
+        self.targets = []
+        self.version = None
+        self.probed = 0
+
+    def _post(self, path, **kwargs):
+        response = self.http.post(f"{self.master}/workers/{self.worker_id}{path}", timeout=30, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def heartbeat(self):
+        assignment = await asyncio.to_thread(self._post, "/heartbeat")
+        if assignment["version"] != self.version:
+            logging.info(f"Worker {self.worker_id}: {len(assignment['targets'])} target(s) of "
+                         f"{assignment['workers']} worker(s)")
+        self.version = assignment["version"]
+        self.targets = assignment["targets"]
+
+    async def run_once(self):
+        """One pass: refresh the assignment, probe it, report the results."""
+        await self.heartbeat()
+        started = time.perf_counter()
+        results = await sweep(self.targets, self.timeout, self.concurrency)
+        elapsed = time.perf_counter() - started
+        batch = [dict(result, key=server_key(server)) for server, result in zip(self.targets, results)]
+        for i in range(0, len(batch), self.batch_size):
+            await asyncio.to_thread(self._post, "/results",
+                                    json={"sweep_seconds": elapsed, "results": batch[i:i + self.batch_size]})
+        self.probed += len(batch)
+        return elapsed
+
+    async def run(self, interval, passes=None):
+        done = 0
+        while passes is None or done < passes:
+            started = time.monotonic()
+            try:
+                await self.run_once()
+            except requests.RequestException as e:
+                logging.error(f"Worker {self.worker_id}: master unreachable: {e}")
+            done += 1
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def leave(self):
+        try:
+            self.http.delete(f"{self.master}/workers/{self.worker_id}", timeout=5)
+        except requests.RequestException:
+            pass
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(
+    master: str = typer.Option("http://127.0.0.1:8000", help="Base URL of the ms_app master"),
+    worker_id: str = typer.Option(None, help="Unique worker name; default: <hostname>-<pid>"),
+    interval: float = typer.Option(10.0, help="Seconds between passes"),
+    timeout: float = typer.Option(DEFAULT_TIMEOUT, help="Per-probe timeout"),
+    concurrency: int = typer.Option(DEFAULT_CONCURRENCY, help="Probes in flight"),
+    batch_size: int = typer.Option(1000, help="Results per ingest request"),
+    passes: int = typer.Option(None, help="Stop after this many passes; default: run until interrupted"),
+):
+    """Probes this worker's share of the monitored targets and reports to the master."""
+    worker = MonitorWorker(master, worker_id or f"{socket.gethostname()}-{os.getpid()}",
+                           os.getenv("MONITOR_WORKER_TOKEN"), timeout, concurrency, batch_size)
+    # SIGTERM leaves the ring too, so the master reassigns our targets without waiting for the TTL
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        asyncio.run(worker.run(interval, passes))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.leave()
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,20 +1,31 @@
 import asyncio
 import json
 import logging
-import socket
-import subprocess
+import orjson
+import os
+import queue
 import threading
-import requests
+import time
+from contextlib import asynccontextmanager
 import tkinter as tk
 from datetime import datetime, timedelta
-from fastapi import FastAPI, WebSocket, HTTPException, Depends
+from fastapi import FastAPI, WebSocket, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 from passlib.context import CryptContext
 from pydantic import BaseModel
 from sqlalchemy import Column, Integer, String, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 from jose import JWTError, jwt
+from app.services import protocol
+from app.services.feed import server_feed, server_key, versioned_response
+from app.services.monitor import GAME_FIELDS, apply_result, sweep
+from app.services.metrics import CONTENT_TYPE, monitor_metrics
+from app.services.alerts import AlertManager, default_sinks
+from app.services.jobs import JobRunner
+from app.services.cluster import WorkerRegistry
+from app.widgets import VirtualListbox
 
 # Logging configuration
 logging.basicConfig(filename="server_monitor.log", level=logging.INFO, format="%(asctime)s - %(message)s")
@@ -75,73 +86,80 @@ try:
         servers = json.load(f)
 except FileNotFoundError:
     servers = []
+server_feed.publish(servers)
+server_keys = [server_key(server) for server in servers]
+servers_by_key = dict(zip(server_keys, servers))
 
 # Save server list to a file
 def save_servers():
     with open("servers.json", "w") as f:
         json.dump(servers, f, indent=4)
 
-# Function to check if a server is reachable via ping
-def check_ping(host):
-    try:
-        output = subprocess.run(["ping", "-n", "1", host], capture_output=True, text=True)
-        return "TTL=" in output.stdout
-    except Exception as e:
-        logging.error(f"Ping error for {host}: {e}")
-        return False
-
-# Function to check if a server is accessible via HTTP
-def check_http(host):
-    try:
-        response = requests.get(f"http://{host}", timeout=5)
-        return response.status_code == 200
-    except requests.RequestException as e:
-        logging.error(f"HTTP check error for {host}: {e}")
-        return False
-
-# Function to check if a server is accessible via TCP
-def check_tcp(host, port):
-    try:
-        with socket.create_connection((host, port), timeout=5):
-            return True
-    except Exception as e:
-        logging.error(f"TCP check error for {host}:{port}: {e}")
-        return False
-
-# Asynchronous server monitoring function
+# One monitoring pass; the job runner schedules it every 10 seconds on the API's event loop
 async def monitor():
-    while True:
-        for server in servers:
-            host = server["host"]
-            method = server.get("method", "ping")
-            port = server.get("port", 80)
-            status = False
-            
-            # Check server status based on selected method (ping, http, tcp)
-            if method == "ping":
-                status = check_ping(host)
-            elif method == "http":
-                status = check_http(host)
-            elif method == "tcp":
-                status = check_tcp(host, port)
-            
-            server["status"] = "UP" if status else "DOWN"
-            log_entry = f"{host} ({method}) is {'UP' if status else 'DOWN'}"
-            print(log_entry)
-            logging.info(log_entry)
-            
-            if not status:
-                send_alert(host, method)
-        
-        save_servers()  # Save the server list to the file
-        await asyncio.sleep(10)
-
-# Function to send alerts when a server goes down
-def send_alert(host, method):
-    print(f"ALERT! {host} ({method}) is DOWN!")
+    # Probe every server concurrently (ping, http, tcp) instead of one after another
+    started = time.perf_counter()
+    results = await sweep(servers)
+    monitor_metrics.record_sweep(servers, results, time.perf_counter() - started)
+    for server in servers:
+        host = server["host"]
+        method = server.get("method", "ping")
+        status = server["status"] == "UP"
+        log_entry = f"{host} ({method}) is {'UP' if status else 'DOWN'}"
+        print(log_entry)
+        logging.info(log_entry)
+
+    # Only state changes (N-of-M failures, recovery) and periodic reminders raise alerts
+    alert_manager.observe_sweep(servers, results, server_key)
+
+    await asyncio.to_thread(save_servers)  # Save the server list to the file
+    server_feed.publish(servers)  # Push only the rows that changed to GUI/dashboard subscribers
+
+# Alerting: per-target state machine with grouped, asynchronous delivery (log + optional webhook)
+alert_manager = AlertManager(default_sinks())
+
+# Distributed mode: monitor_worker processes probe the targets (split by consistent hashing)
+# and post results here; this process only merges them into the status view
+DISTRIBUTED = os.getenv("MONITOR_DISTRIBUTED", "false").lower() == "true"
+WORKER_TOKEN = os.getenv("MONITOR_WORKER_TOKEN")  # Shared secret workers must send
+if DISTRIBUTED and not WORKER_TOKEN:
+    # Anyone reaching the port could otherwise join the ring and report every target as up
+    raise RuntimeError("MONITOR_DISTRIBUTED=true requires MONITOR_WORKER_TOKEN")
+workers = WorkerRegistry()
+reported = {}  # Target key -> result reported since the last merge
+latest_results = {}  # Target key -> last reported result
+ingest_stats = {"batches": 0, "results": 0, "sweep_seconds": 0.0}
+
+# One merge pass over the results workers reported since the previous one
+async def merge_worker_results():
+    global reported
+    workers.expire()
+    fresh, reported = reported, {}
+    if fresh:
+        alert_manager.observe_sweep([servers_by_key[key] for key in fresh], list(fresh.values()), server_key, complete=False)
+    alert_manager.prune(server_keys)
+    known = [key for key in server_keys if key in latest_results]
+    monitor_metrics.record_sweep([servers_by_key[key] for key in known], [latest_results[key] for key in known],
+                                 ingest_stats["sweep_seconds"])
+    ingest_stats["sweep_seconds"] = 0.0
+    await asyncio.to_thread(save_servers)
+    server_feed.publish(servers)
+
+# Background work shares the API's event loop: sweeps never overlap, and a sweep that
+# runs past its budget is cancelled instead of piling up behind the next one
+jobs = JobRunner()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Alerts are delivered by their own task so slow sinks never delay the next sweep
+    dispatcher = asyncio.create_task(alert_manager.run())
+    await jobs.start()
+    yield
+    await jobs.stop()
+    dispatcher.cancel()
 
 # FastAPI application setup
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -191,49 +209,175 @@ def login(user: UserCreate, db: Session = Depends(get_db)):
     logging.info(f"User logged in: {user.username}")
     return {"access_token": token, "token_type": "bearer"}
 
-# WebSocket to notify clients of server status
-clients = []
+# WebSocket to notify clients of server status (client -> negotiated subprotocol)
+clients = {}
 async def notify_clients():
-    while True:
-        servers_data = json.dumps(servers)
-        for client in clients:
-            try:
-                await client.send_text(servers_data)
-            except Exception:
-                clients.remove(client)
-        await asyncio.sleep(5)
+    # Encode the server list once per subprotocol in use, not once per client
+    frames = {}
+    for client, subprotocol in list(clients.items()):
+        if subprotocol not in frames:
+            frames[subprotocol] = protocol.encode_servers(servers, subprotocol)
+        try:
+            await protocol.send_frame(client, frames[subprotocol])
+        except Exception:
+            clients.pop(client, None)
+
+if DISTRIBUTED:
+    jobs.add(merge_worker_results, interval=10, timeout=60)
+else:
+    jobs.add(monitor, interval=10, timeout=float(os.getenv("MONITOR_SWEEP_TIMEOUT", "60")))
+jobs.add(notify_clients, interval=5, timeout=30)
 
 # WebSocket endpoint
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    clients.append(websocket)
+    clients[websocket] = await protocol.accept(websocket)
     try:
         while True:
             await websocket.receive_text()
     except Exception:
-        clients.remove(websocket)
+        clients.pop(websocket, None)
+
+# WebSocket change feed: a snapshot on connect, then row-level diffs after each sweep
+@app.websocket("/ws/feed")
+async def feed_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    events = server_feed.subscribe_async()
+    try:
+        while True:
+            await websocket.send_json(await events.get())
+    except Exception:
+        pass
+    finally:
+        server_feed.unsubscribe(events)
+
+# Server list for polling clients: ETag/304, or `?since=<version>&wait=<seconds>` for
+# only the rows changed by later sweeps (blocking until a sweep changes something)
+@app.get("/servers")
+async def list_servers(request: Request, since: int | None = None, wait: float = 0):
+    return await versioned_response(request, server_feed, lambda: orjson.dumps(server_feed.snapshot()["snapshot"]), since, wait)
+
+# One probe result as reported by a monitor worker (the shape of services.monitor results)
+class ProbeResult(BaseModel):
+    key: str  # services.feed.server_key of the target
+    up: bool
+    rtt: float | None = None
+    duration: float | None = None
+    reason: str | None = None
+    players: int | None = None  # udpquery targets only
+    max_players: int | None = None
+    map: str | None = None
+
+    def as_result(self):
+        # The game fields only when reported, like the probes' own results
+        return self.model_dump(exclude={field for field in GAME_FIELDS if getattr(self, field) is None})
+
+# Batch of probe results from a monitor worker
+class WorkerResults(BaseModel):
+    sweep_seconds: float = 0.0  # How long the worker's sweep took
+    results: list[ProbeResult]
+
+def check_worker(authorization: str | None = Header(None)):
+    if WORKER_TOKEN and authorization != f"Bearer {WORKER_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid worker token")
+
+# Worker heartbeat: joins the hash ring and returns the worker's current share of the targets
+@app.post("/workers/{worker_id}/heartbeat", dependencies=[Depends(check_worker)])
+async def worker_heartbeat(worker_id: str):
+    workers.heartbeat(worker_id)
+    keys = workers.assignment(worker_id, server_keys)
+    return {"version": workers.version, "workers": len(workers.workers), "targets": [servers_by_key[key] for key in keys]}
+
+# Batched result ingest; statuses are merged right away, alerts/metrics/feed on the next merge pass.
+# Only live workers may report, and only on the targets the ring currently gives them: a
+# worker that expired or left mid-sweep must heartbeat (and get a fresh share) first, and
+# results for targets that moved to another worker since are dropped
+@app.post("/workers/{worker_id}/results", dependencies=[Depends(check_worker)])
+async def worker_results(worker_id: str, batch: WorkerResults):
+    if not workers.touch(worker_id):
+        raise HTTPException(status_code=409, detail="Unknown worker; heartbeat first")
+    accepted = 0
+    for probe in batch.results:
+        key = probe.key
+        server = servers_by_key.get(key)
+        if server is None or workers.owner(key) != worker_id:
+            continue
+        result = probe.as_result()
+        apply_result(server, result)
+        reported[key] = latest_results[key] = result
+        accepted += 1
+    ingest_stats["batches"] += 1
+    ingest_stats["results"] += accepted
+    ingest_stats["sweep_seconds"] = max(ingest_stats["sweep_seconds"], batch.sweep_seconds)
+    return {"accepted": accepted}
+
+# Worker shutdown: leaves the ring so its targets move to the others right away
+@app.delete("/workers/{worker_id}", dependencies=[Depends(check_worker)])
+async def worker_leave(worker_id: str):
+    workers.leave(worker_id)
+    return {"workers": len(workers.workers)}
+
+# Live workers and how many targets each one owns
+@app.get("/workers")
+async def list_workers():
+    workers.expire()
+    return {
+        "version": workers.version,
+        "workers": {worker_id: len(workers.assignment(worker_id, server_keys)) for worker_id in list(workers.workers)},
+        "ingested": ingest_stats["results"],
+    }
+
+# Prometheus metrics for the monitor's own probes (rendered once per sweep)
+@app.get("/metrics")
+def metrics():
+    return Response(monitor_metrics.exposition() + jobs.exposition().encode("utf-8"), media_type=CONTENT_TYPE)
+
+# Lightweight web dashboard driven by the change feed
+@app.get("/dashboard")
+def dashboard():
+    return FileResponse("app/templates/servers.html")
 
 # Tkinter GUI for server monitoring
 class ServerMonitorApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Server Monitor")
-        self.server_list = tk.Listbox(root)
-        self.server_list.pack()
+        self.server_list = VirtualListbox(root)
+        self.server_list.pack(fill=tk.BOTH, expand=True)
+        self.events = server_feed.subscribe()
         self.update_servers()
     
     def update_servers(self):
-        # Update server status in Tkinter Listbox
-        self.server_list.delete(0, tk.END)
-        for server in servers:
-            self.server_list.insert(tk.END, f"{server['host']} - {server['method']} - {server['status']}")
-        self.root.after(5000, self.update_servers)  # Update every 5 seconds
+        # Apply pending feed events to the rows they touch instead of rebuilding the Listbox
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if "snapshot" in event:
+                    self.server_list.clear()
+                    for server in event["snapshot"]:
+                        self.show_server(server)
+                for change in event.get("changes", []):
+                    if change["op"] == "upsert":
+                        self.show_server(change["row"])
+                    else:
+                        self.server_list.remove_row(change["key"])
+        except queue.Empty:
+            pass
+        self.root.after(200, self.update_servers)
+
+    def show_server(self, server):
+        status = server.get("status")
+        color = {"UP": "green", "DOWN": "red"}.get(status)
+        text = f"{server['host']} - {server['method']} - {status}"
+        if server.get("players") is not None:
+            text += f" - {server['players']}/{server['max_players']} on {server['map']}"
+        self.server_list.set_row(server_key(server), text, color)
 
 # Function to run FastAPI server
 def start_fastapi():
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    # Bind address is configurable so Prometheus (in docker) can scrape /metrics
+    uvicorn.run(app, host=os.getenv("MONITOR_HOST", "127.0.0.1"), port=int(os.getenv("MONITOR_PORT", "8000")))
 
 # Function to start Tkinter GUI
 def start_gui():
@@ -241,12 +385,6 @@ def start_gui():
     app = ServerMonitorApp(root)
     root.mainloop()
 
-# Function to start server monitoring
-def run_monitor():
-    import asyncio
-    asyncio.run(monitor())  # Start server monitoring
-
 if __name__ == "__main__":
-    threading.Thread(target=start_fastapi, daemon=True).start()  # Start FastAPI in a separate thread
-    threading.Thread(target=run_monitor, daemon=True).start()  # Start server monitoring in a separate thread
+    threading.Thread(target=start_fastapi, daemon=True).start()  # Start FastAPI (and the monitoring jobs) in a separate thread
     start_gui()  # Start Tkinter GUI in the main thread
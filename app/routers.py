@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket
+from sqlalchemy import exists, select
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 import asyncio
-from . import models, schemas, auth, security
-from app.database import get_db
-from app.update_users import start_updating
+import heapq
+import time
+from . import models, schemas, auth, security, crud
+from app.services import protocol
+from app.services.feed import user_feed, versioned_response
+from app.services.regions import region_assigner, REGION_PROBE_URLS
+from app.services.presence import presence
+from app.services.availability import availability
+from app.services.search import search_index, search_database, MAX_LIMIT
+from app.database import get_db, get_read_db, read_session, scatter
 from app.auth import register_user, authenticate_user
 from app.schemas import UserCreate, Token
+from app.config import settings
 
 def get_db():
     # Creates a new database session and ensures it is closed after use
@@ -18,8 +27,8 @@ def get_db():
 
 router = APIRouter()
 
-# Starts the process of updating users when the application starts
-start_updating()
+# Columns of models.User in the order schemas.dump_user_rows expects
+USER_COLUMNS = [getattr(models.User, field) for field in schemas.USER_ROW_FIELDS]
 
 # Register a new user
 @router.post("/register", response_model=dict)
@@ -29,35 +38,103 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="User already exists")
     return {"message": "Registration successful"}
 
+# Username/email availability for the signup form: values the in-memory filter has never
+# seen are answered without a query, the rest (or everything before it has loaded) are looked up
+@router.get("/users/available")
+def users_available(username: str | None = None, email: str | None = None, db: Session = Depends(get_read_db)):
+    if username is None and email is None:
+        raise HTTPException(status_code=400, detail="Pass a username and/or an email")
+    result = {}
+    if username is not None:
+        result["username"] = not (availability.may_exist(username=username) and _in_use(db, models.User.username, username))
+    if email is not None:
+        result["email"] = not (availability.may_exist(email=email) and _in_use(db, models.User.email, email))
+    return result
+
+def _in_use(db, column, value):
+    # One EXISTS per shard in sharded storage (a plain query would get a row back from each)
+    statement = select(exists().where(column == value))
+    return any(scatter(db, lambda shard: shard.execute(statement).scalar()))
+
+# Username/email prefix search, ranked (username matches first) and paginated; served from
+# the in-memory index, or the database until the index has loaded
+@router.get("/users/search")
+def search_users(q: str, limit: int = 20, offset: int = 0, db: Session = Depends(get_read_db)):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    limit = min(max(limit, 1), MAX_LIMIT)
+    offset = max(offset, 0)
+    if search_index.ready:
+        results, more = search_index.search(q, limit, offset)
+    else:
+        results, more = search_database(db, q, limit, offset)
+    return {"query": q, "results": results, "next_offset": offset + limit if more else None}
+
 # Authenticate user and return JWT token
 @router.post("/login", response_model=Token)
-def login(user: UserCreate, db: Session = Depends(get_db)):
+def login(user: UserCreate, request: Request, db: Session = Depends(get_read_db)):
     # Authenticates the user and generates a JWT token if the credentials are correct
     token = authenticate_user(db, user.username, user.password)
     if not token:
         raise HTTPException(status_code=401, detail="Invalid username or password")
-    return {"access_token": token, "token_type": "bearer"}
+    presence.touch(user.username)
+    # Lowest-latency region from the user's RTT samples, else from the client's network prefix
+    region, ping = region_assigner.assign(user.username, request.client.host if request.client else None)
+    if region is None:
+        region = db.query(models.User.region).filter(models.User.username == user.username).scalar()
+    return {"access_token": token, "token_type": "bearer", "region": region, "ping": round(ping) if ping is not None else None}
+
+# List regions and the endpoints clients should measure RTT against
+@router.get("/regions")
+def list_regions():
+    return [{"region": region, "probe_url": REGION_PROBE_URLS.get(region, f"/regions/probe/{region}")} for region in models.VALID_REGIONS]
+
+# Lightweight endpoint clients time to measure RTT to a region
+@router.get("/regions/probe/{region}")
+def region_probe(region: str):
+    if region not in models.VALID_REGIONS:
+        raise HTTPException(status_code=404, detail="Unknown region")
+    return {"region": region, "server_time": time.time()}
+
+# Report measured RTTs; returns the assigned region and stores it when it changes
+@router.post("/regions/samples", response_model=schemas.RegionAssignment)
+def report_region_samples(samples: schemas.RegionSamples, request: Request, current_user: models.User = Depends(security.verify_token), db: Session = Depends(get_db)):
+    try:
+        region, ping = region_assigner.record(current_user.username, request.client.host if request.client else None, samples.samples)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ping = min(round(ping), 1000)
+    db_user = db.query(models.User).filter(models.User.username == current_user.username).first()
+    # Only write when the assignment moved noticeably, not on every sample
+    if db_user and (db_user.region != region or db_user.ping is None or abs(db_user.ping - ping) >= 10):
+        db_user.region = region
+        db_user.ping = ping
+        crud.move_to_region_shard(db, db_user)
+        db.commit()
+        crud.publish_user(db_user)
+    return {"region": region, "ping": ping}
 
 # Create a new user in the database
 @router.post("/users/", response_model=schemas.UserResponse)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     # Adds a new user to the database and returns the user details
-    db_user = models.User(
-        username=user.username,
-        email=user.email,
-        password=user.password,
-        region=user.region
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    if user.region is not None and user.region not in models.VALID_REGIONS:
+        raise HTTPException(status_code=400, detail=f"Region must be one of: {', '.join(models.VALID_REGIONS)}")
+    return crud.create_user(db, user.username, user.email, user.password, user.region)
 
-# Get a list of all users
-@router.get("/users/", response_model=list[schemas.UserResponse])
-def get_users(db: Session = Depends(get_db)):
-    # Fetches and returns all users from the database
-    return db.query(models.User).all()
+# Get a list of all users. Supports If-None-Match (304 without touching the database)
+# and `?since=<version>&wait=<seconds>` long-polls that return only the changed rows.
+@router.get("/users/", response_model=list[schemas.UserResponse], responses={304: {"description": "Not modified"}})
+async def get_users(request: Request, since: int | None = None, wait: float = 0, db: Session = Depends(get_read_db)):
+    def load():
+        # The ETag is the primary's version: a replica serves the rows only once check() has
+        # confirmed it holds that version (read now, so it's at least the ETag's), else the primary does
+        db.info["min_version"] = user_feed.version
+        # Fetches only the served columns as tuples (from every shard in parallel, merged by id)
+        # and encodes them in one pass (no ORM objects or per-row models)
+        parts = scatter(db, lambda shard: shard.query(*USER_COLUMNS).order_by(models.User.id).all())
+        return schemas.dump_user_rows(parts[0] if len(parts) == 1 else heapq.merge(*parts))
+    return await versioned_response(request, user_feed, load, since, wait)
 
 # Update user data, such as ping values
 @router.post("/update_users/")
@@ -67,29 +144,51 @@ def update_users(db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Users updated"}
 
+# Heartbeat from a logged-in client; keeps the user in the active set (memory only)
+@router.post("/presence/heartbeat")
+def heartbeat(current_user: models.User = Depends(security.verify_token)):
+    presence.touch(current_user.username)
+    return {"active_users": presence.count()}
+
+# Users active within the presence window, most recent first (served from memory)
+@router.get("/users/active")
+def active_users():
+    return [{"username": username, "last_login": seen} for username, seen in presence.active()]
+
 # WebSocket to send real-time updates to clients
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)):
-    await websocket.accept()
+async def websocket_endpoint(websocket: WebSocket, token: str | None = None):
+    # Negotiates JSON (default), MessagePack or struct framing via the subprotocol header
+    subprotocol = await protocol.accept(websocket)
+    # An access token (?token=) marks the user present for as long as the socket stays open
+    payload = auth.decode_access_token(token) if token else None
+    username = payload.get("sub") if payload else None
     while True:
-        # Fetches all users and sends their data to the client every 10 seconds
-        users = db.query(models.User).all()
-        data = [{"id": u.id, "username": u.username, "ping": u.ping, "color": u.get_ping_color()} for u in users]
-        await websocket.send_json(data)
+        if username:
+            presence.touch(username)
+        # Fetches all users and sends their data to the client every 10 seconds.
+        # A short-lived session per tick (on a read replica when configured), so idle
+        # sockets don't pin pooled connections.
+        with read_session() as db:
+            users = db.query(models.User).all()
+            rows = [(u.id, u.username, u.ping, u.get_ping_color()) for u in users]
+        await protocol.send_frame(websocket, protocol.encode_users(rows, subprotocol))
         await asyncio.sleep(10)  # Send updates every 10 seconds
 
 # Obtain an access token using a username and password
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: schemas.UserCreate, db: Session = Depends(get_db)):
+def login_for_access_token(form_data: schemas.UserCreate, db: Session = Depends(get_read_db)):
     # Validates user credentials and returns a JWT token
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+    access_token = auth.authenticate_user(db, form_data.username, form_data.password)
+    if not access_token:
         raise HTTPException(status_code=401, detail="Invalid username or password")
-    access_token = auth.create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
 # Get the currently authenticated user
 @router.get("/users/me", response_model=schemas.User)
-def read_users_me(current_user: schemas.User = Depends(security.verify_token)):
-    # Returns the current authenticated user's information
-    return current_user
+def read_users_me(current_user: models.User = Depends(security.verify_token), db: Session = Depends(get_read_db)):
+    # Returns the current authenticated user's information (the token only carries the username)
+    user = db.query(models.User).filter(models.User.username == current_user.username).first()
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
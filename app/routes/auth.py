@@ -1,22 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
 from schemas import UserCreate, UserResponse
 from utils import hash_password, verify_password  # Исправленный импорт
+from app import crud
+from app.services.availability import availability
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse)
 def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already taken")
+    # Skip the lookup for names the availability filter has never seen; the unique constraint still decides
+    if availability.may_exist(user_data.username):
+        existing_user = db.query(User).filter(User.username == user_data.username).first()
+        if existing_user:
+            raise HTTPException(status_code=400, detail="Username already taken")
     
-    new_user = User(username=user_data.username, hashed_password=hash_password(user_data.password))
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        # Also updates the availability filter and search index
+        new_user = crud.create_user(db, user_data.username, user_data.email, user_data.password, user_data.region)
+    except IntegrityError:
+        db.rollback()
+        if db.query(User).filter(User.username == user_data.username).first():
+            raise HTTPException(status_code=400, detail="Username already taken")
+        raise
     
     return new_user
 
@@ -1,4 +1,5 @@
-from pydantic import BaseModel 
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict
 
 # UserCreate model for creating a new user, with optional region
 class UserCreate(BaseModel):
@@ -11,17 +12,46 @@ class UserCreate(BaseModel):
 class UserResponse(BaseModel):
     id: int  # User's unique ID
     username: str  # Username of the user
-    email: str  # Email address of the user
+    email: str | None = None  # Email address of the user (none for users from /register)
     is_active: bool  # Whether the user is active
     region: str | None = None  # Optional region of the user
 
     class Config:
         from_attributes = True  # Enable mapping from attributes
 
+# Plain row shape of UserResponse, for serializing query tuples without building a model per row
+class UserRow(TypedDict):
+    id: int
+    username: str
+    email: str | None
+    is_active: bool
+    region: str | None
+
+# Column order expected by dump_user_rows
+USER_ROW_FIELDS = tuple(UserRow.__annotations__)
+
+# Serializer compiled once at import, reused for every list response
+user_rows_adapter = TypeAdapter(list[UserRow])
+
+def dump_user_rows(rows) -> bytes:
+    # Encodes (id, username, email, is_active, region) tuples as a JSON array of UserResponse objects
+    return user_rows_adapter.dump_json([dict(zip(USER_ROW_FIELDS, row)) for row in rows])
+
 # Token model to represent JWT access token and token type
 class Token(BaseModel):
     access_token: str  # JWT access token
     token_type: str  # Type of the token (e.g., "bearer")
+    region: str | None = None  # Lowest-latency region assigned on login
+    ping: int | None = None  # Expected ping to that region in ms, if measured
+
+# RTT samples (ms) reported by a client after probing each region's endpoint
+class RegionSamples(BaseModel):
+    samples: dict[str, float]  # Region -> measured round-trip time in ms
+
+# Region chosen for the client and its expected ping
+class RegionAssignment(BaseModel):
+    region: str | None = None  # Assigned region
+    ping: int | None = None  # Expected ping in ms
 
 # Base user model with just the username
 class UserBase(BaseModel):
@@ -32,4 +62,4 @@ class User(UserBase):
     id: int  # User's unique ID
 
     class Config:
-        orm_mode = True  # Enable ORM mode for compatibility with SQLAlchemy
+        from_attributes = True  # Enable mapping from SQLAlchemy objects
@@ -3,7 +3,9 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
 from . import config, models, database
+from .services.availability import availability
 
 # Create an object for working with bcrypt
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -54,13 +56,18 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
 # Function to register a new user
 def register_user(db, username: str, password: str) -> bool:
     """Adds a new user to the database."""
-    existing_user = db.query(models.User).filter(models.User.username == username).first()
-    if existing_user:
+    from . import crud  # crud imports this module
+
+    # Skip the lookup for names the availability filter has never seen; the unique constraint still decides
+    if availability.may_exist(username) and db.query(models.User).filter(models.User.username == username).first():
         return False  # User already exists
-    hashed_password = hash_password(password)
-    new_user = models.User(username=username, hashed_password=hashed_password)
-    db.add(new_user)
-    db.commit()
+    try:
+        crud.create_user(db, username, None, password)  # Also updates the availability filter and search index
+    except IntegrityError:
+        db.rollback()
+        if db.query(models.User).filter(models.User.username == username).first():
+            return False  # Registered concurrently, or by another process
+        raise
     return True
 
 # Function to authenticate a user
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import requests
+
+# Alerting for the server monitor. Each target runs a small state machine
+# (ok -> firing -> ok) fed by probe results; only transitions and periodic
+# re-notifications produce alerts, and alerts raised close together are grouped
+# into one notification. Delivery happens on a queue drained by a separate task,
+# so slow sinks never hold up the probe loop.
+
+OK = "ok"
+FIRING = "firing"
+
+# Fire when at least FAILURES of the last WINDOW probes failed
+FAILURES = int(os.getenv("ALERT_FAILURES", "3"))
+WINDOW = int(os.getenv("ALERT_WINDOW", "5"))
+# Resolve after this many consecutive successful probes
+RECOVERIES = int(os.getenv("ALERT_RECOVERIES", "2"))
+# Remind about targets that stay down (seconds)
+RENOTIFY_INTERVAL = float(os.getenv("ALERT_RENOTIFY_INTERVAL", "3600"))
+# Collect alerts for this long before sending one grouped notification (seconds)
+GROUP_WAIT = float(os.getenv("ALERT_GROUP_WAIT", "5"))
+QUEUE_SIZE = 10000
+
+
+class TargetState:
+    def __init__(self, window):
+        self.status = OK
+        self.history = deque(maxlen=window)  # True = probe failed
+        self.successes = 0
+        self.since = None
+        self.last_notified = None
+        self.reason = None
+
+
+class AlertManager:
+    def __init__(self, sinks=None, failures=FAILURES, window=WINDOW, recoveries=RECOVERIES,
+                 renotify_interval=RENOTIFY_INTERVAL, group_wait=GROUP_WAIT, queue_size=QUEUE_SIZE):
+        self.sinks = sinks if sinks is not None else [LogSink()]
+        self.failures = failures
+        self.window = window
+        self.recoveries = recoveries
+        self.renotify_interval = renotify_interval
+        self.group_wait = group_wait
+        self.targets = {}
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.sent = 0
+
+    def observe(self, key, server, up, reason=None, now=None):
+        """Feeds one probe result; returns the alert kind raised ("firing", "resolved", "repeat") or None."""
+        now = time.time() if now is None else now
+        state = self.targets.get(key)
+        if state is None:
+            state = self.targets[key] = TargetState(self.window)
+        state.history.append(not up)
+        state.successes = state.successes + 1 if up else 0
+        if not up:
+            state.reason = reason
+
+        kind = None
+        if state.status == OK and sum(state.history) >= self.failures:
+            state.status, state.since = FIRING, now
+            kind = "firing"
+        elif state.status == FIRING and state.successes >= self.recoveries:
+            state.status = OK
+            state.history.clear()
+            kind = "resolved"
+        elif state.status == FIRING and not state.successes and now - state.last_notified >= self.renotify_interval:
+            kind = "repeat"  # Not while a recovery streak is under way
+
+        if kind:
+            state.last_notified = now
+            self._enqueue({
+                "kind": kind,
+                "target": key,
+                "host": server["host"],
+                "method": server.get("method", "ping"),
+                "port": server.get("port"),
+                "reason": state.reason,
+                "since": datetime.fromtimestamp(state.since, timezone.utc).isoformat() if state.since else None,
+            })
+        return kind
+
+    def observe_sweep(self, servers, results, key, now=None, complete=True):
+        """Feeds a whole sweep; `key` maps a server entry to its target id.
+
+        With `complete` (the default), `servers` is every monitored target, and the state of
+        targets no longer among them (removed from servers.json) is dropped. Pass False for
+        partial batches, such as the results distributed workers reported, and prune() instead.
+        """
+        keys = [key(server) for server in servers]
+        for target, server, result in zip(keys, servers, results):
+            self.observe(target, server, result["up"], result.get("reason"), now)
+        if complete:
+            self.prune(keys)
+
+    def prune(self, keys):
+        """Forgets every target not in `keys`."""
+        keys = set(keys)
+        for target in [target for target in self.targets if target not in keys]:
+            del self.targets[target]
+
+    def _enqueue(self, alert):
+        try:
+            self.queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            self.dropped += 1  # Never block the probe loop on a backed-up dispatcher
+
+    async def run(self):
+        """Drains the alert queue forever, sending one grouped notification per burst."""
+        while True:
+            alerts = [await self.queue.get()]
+            deadline = time.monotonic() + self.group_wait
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    alerts.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.dispatch(group(alerts))
+
+    async def dispatch(self, notification):
+        results = await asyncio.gather(*(sink.send(notification) for sink in self.sinks), return_exceptions=True)
+        for sink, result in zip(self.sinks, results):
+            if isinstance(result, Exception):
+                logging.error(f"Alert sink {type(sink).__name__} failed: {result}")
+        self.sent += 1
+
+
+def group(alerts):
+    """Builds one notification out of a burst of alerts."""
+    notification = {"timestamp": datetime.now(timezone.utc).isoformat(), "firing": [], "resolved": [], "repeat": []}
+    for alert in alerts:
+        notification[alert["kind"]].append(alert)
+    parts = []
+    if notification["firing"]:
+        parts.append(f"{len(notification['firing'])} DOWN: " + ", ".join(a["target"] for a in notification["firing"][:10]))
+    if notification["repeat"]:
+        parts.append(f"{len(notification['repeat'])} still DOWN: " + ", ".join(a["target"] for a in notification["repeat"][:10]))
+    if notification["resolved"]:
+        parts.append(f"{len(notification['resolved'])} recovered: " + ", ".join(a["target"] for a in notification["resolved"][:10]))
+    notification["summary"] = "; ".join(parts)
+    return notification
+
+
+class LogSink:
+    """Writes notifications to the monitor log (and stdout, like the old send_alert)."""
+
+    async def send(self, notification):
+        message = f"ALERT! {notification['summary']}"
+        print(message)
+        logging.warning(message)
+
+
+class WebhookSink:
+    """POSTs notifications as JSON; the blocking request runs in a worker thread."""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    async def send(self, notification):
+        response = await asyncio.to_thread(requests.post, self.url, json=notification, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def default_sinks():
+    sinks = [LogSink()]
+    if os.getenv("ALERT_WEBHOOK_URL"):
+        sinks.append(WebhookSink(os.getenv("ALERT_WEBHOOK_URL")))
+    return sinks
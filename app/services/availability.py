@@ -0,0 +1,133 @@
+import hashlib
+import math
+import os
+import threading
+
+from sqlalchemy import select
+
+from app.database import SessionLocal, scatter
+from app.models import User
+
+# Username/email availability without a query per check.
+#
+# Two counting Bloom filters (one per column) are built at startup by streaming the
+# users table and kept current by crud/auth on create, rename and delete. "Not in the
+# filter" means the value is definitely unused in this process's view, so registration
+# skips its SELECT and relies on the unique constraint; "maybe" falls back to the
+# database. Other processes' writes aren't seen until the next load, which only turns
+# into a constraint violation on insert, never into a duplicate.
+
+CAPACITY = int(os.getenv("AVAILABILITY_CAPACITY", "1000000"))  # Expected values per filter
+ERROR_RATE = float(os.getenv("AVAILABILITY_ERROR_RATE", "0.01"))  # False positive rate at capacity
+LOAD_BATCH = 10000
+
+
+class CountingBloomFilter:
+    """Bloom filter with 8-bit saturating counters, so values can be removed again."""
+
+    def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE):
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.counters = bytearray(self.size)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            if self.counters[position] < 255:
+                self.counters[position] += 1
+        self.count += 1
+
+    def remove(self, value):
+        """Only for values that were added; a saturated counter stays put rather than risk a false negative.
+
+        A value that isn't in the filter at all was never added and is ignored, so neither
+        the other values' counters nor `count` (values added and not removed) drift.
+        """
+        positions = self._positions(value)
+        if not all(self.counters[position] for position in positions):
+            return
+        for position in positions:
+            if self.counters[position] < 255:
+                self.counters[position] -= 1
+        self.count -= 1
+
+    def __contains__(self, value):
+        return all(self.counters[position] for position in self._positions(value))
+
+
+class AvailabilityIndex:
+    def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.usernames = CountingBloomFilter(capacity, error_rate)
+        self.emails = CountingBloomFilter(capacity, error_rate)
+        self.ready = False  # Until the first load every check goes to the database
+        self._pending = None  # Values added while a load is streaming, replayed onto its result
+        self._lock = threading.Lock()
+
+    def _apply(self, usernames, emails, op, username, email):
+        if username:
+            getattr(usernames, op)(username)
+        if email:
+            getattr(emails, op)(email)
+
+    def add(self, username, email=None):
+        with self._lock:
+            self._apply(self.usernames, self.emails, "add", username, email)
+            if self._pending is not None:
+                self._pending.append((username, email))
+
+    def remove(self, username, email=None):
+        with self._lock:
+            # Not replayed onto a load in progress: the stream may never have seen the row, and
+            # a stale entry only costs a query, while a spurious decrement could hide another value
+            self._apply(self.usernames, self.emails, "remove", username, email)
+
+    def load(self, session_factory=SessionLocal):
+        """Rebuilds both filters from the users table (every shard), streaming it in batches."""
+        with self._lock:
+            self._pending = []
+        try:
+            with session_factory() as db:
+                total = sum(scatter(db, lambda shard: shard.query(User).count()))
+                # Size for the table as it is now plus room to grow, so the error rate holds
+                capacity = max(self.capacity, 2 * total)
+                usernames = CountingBloomFilter(capacity, self.error_rate)
+                emails = CountingBloomFilter(capacity, self.error_rate)
+                build_lock = threading.Lock()
+
+                def read(shard):
+                    result = shard.execute(select(User.username, User.email).execution_options(yield_per=LOAD_BATCH))
+                    for partition in result.partitions():
+                        with build_lock:
+                            for username, email in partition:
+                                self._apply(usernames, emails, "add", username, email)
+
+                scatter(db, read)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for username, email in self._pending:
+                self._apply(usernames, emails, "add", username, email)
+            self.usernames, self.emails = usernames, emails
+            self._pending = None
+            self.ready = True
+        return usernames.count
+
+    def may_exist(self, username=None, email=None):
+        """False only if neither value can be in use; True means check the database."""
+        if not self.ready:
+            return True
+        return (username is not None and username in self.usernames) or (email is not None and email in self.emails)
+
+
+# Shared index for the register paths and /users/available; main.py loads it at startup
+availability = AvailabilityIndex()
@@ -0,0 +1,118 @@
+import bisect
+import hashlib
+import os
+import threading
+import time
+
+# Distributed monitoring. Workers (app/monitor_worker.py) heartbeat the master, which
+# assigns each monitored target to exactly one live worker with a consistent-hash
+# ring; when a worker joins, leaves or stops heartbeating only ~1/N of the targets
+# move. Workers probe their share and post the results back in batches.
+
+# Virtual nodes per worker; more gives a more even split
+REPLICAS = int(os.getenv("MONITOR_RING_REPLICAS", "128"))
+# A worker that hasn't heartbeated for this long is dropped from the ring (seconds)
+WORKER_TTL = float(os.getenv("MONITOR_WORKER_TTL", "30"))
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self.nodes = set()
+        self._points = []  # Sorted hashes of every virtual node
+        self._owners = []  # Node owning the point at the same index
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        keep = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in keep]
+        self._owners = [owner for _, owner in keep]
+
+    def node_for(self, key):
+        """The node owning `key`: the first virtual node clockwise from its hash."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class WorkerRegistry:
+    """Live monitor workers and their share of the targets."""
+
+    def __init__(self, ttl=WORKER_TTL, replicas=REPLICAS):
+        self.ttl = ttl
+        self.workers = {}  # worker id -> last heartbeat (monotonic)
+        self.ring = HashRing(replicas=replicas)
+        self.version = 0  # Bumped whenever membership (and so the assignment) changes
+        self._assignments = None  # (version, keys, {worker id: [key, ...]})
+        self._lock = threading.Lock()
+
+    def heartbeat(self, worker_id, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if worker_id not in self.workers:
+                self.ring.add(worker_id)
+                self.version += 1
+            self.workers[worker_id] = now
+            self._expire(now)
+
+    def touch(self, worker_id, now=None):
+        """Refreshes a live worker's heartbeat; False (and no rejoin) if it isn't in the ring."""
+        with self._lock:
+            if worker_id not in self.workers:
+                return False
+            self.workers[worker_id] = time.monotonic() if now is None else now
+            return True
+
+    def owner(self, key):
+        """The worker `key` is currently assigned to (None without workers)."""
+        with self._lock:
+            return self.ring.node_for(key)
+
+    def leave(self, worker_id):
+        with self._lock:
+            if self.workers.pop(worker_id, None) is not None:
+                self.ring.remove(worker_id)
+                self.version += 1
+
+    def expire(self, now=None):
+        with self._lock:
+            self._expire(time.monotonic() if now is None else now)
+
+    def _expire(self, now):
+        for worker_id, seen in list(self.workers.items()):
+            if now - seen > self.ttl and worker_id in self.workers:
+                del self.workers[worker_id]
+                self.ring.remove(worker_id)
+                self.version += 1
+
+    def assignment(self, worker_id, keys):
+        """The subset of `keys` owned by `worker_id`; recomputed only when membership or keys change."""
+        with self._lock:
+            cached = self._assignments
+            if cached is None or cached[0] != self.version or cached[1] is not keys:
+                shares = {worker: [] for worker in self.workers}
+                for key in keys:
+                    owner = self.ring.node_for(key)
+                    if owner is not None:
+                        shares[owner].append(key)
+                cached = self._assignments = (self.version, keys, shares)
+            return cached[2].get(worker_id, [])
@@ -0,0 +1,223 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response
+
+# Events kept for `?since=` delta requests; older clients get a full snapshot instead
+HISTORY = 1000
+# Upper bound for `?wait=` long-polls (seconds)
+MAX_WAIT = 60
+
+
+def server_key(server):
+    """Identifies a monitored server entry (the same host can be checked by several methods)."""
+    return f"{server['host']}/{server.get('method', 'ping')}/{server.get('port', '')}"
+
+
+class ChangeFeed:
+    """Row-level change feed.
+
+    Publishers hand over the full current list of rows; the feed diffs it against the
+    previous snapshot and pushes only upserted/removed rows to subscribers. Subscribers
+    can live in other threads (queue.Queue) or on an event loop (asyncio.Queue).
+
+    The version also backs conditional GETs (ETag) and `?since=` long-polls, which
+    replay the retained event history. Versions start at the feed's creation time in
+    milliseconds so they keep increasing across restarts: a `since` from a previous
+    process is older than the history and gets a snapshot rather than wrong deltas.
+
+    The feed lives in one process, so the app must run as a single worker (no
+    `uvicorn --workers N`, WEB_CONCURRENCY unset or 1): with several, each worker has
+    its own version counter and history, a client alternating between them gets ETags
+    and `since` values that mean nothing to the other, and a write only wakes the
+    long-polls of the worker that made it. The other in-memory state (availability and
+    search indexes, presence) has the same constraint; scale with replicas behind the
+    primary instead (see app.database.ReplicaSet).
+    """
+
+    def __init__(self, key=server_key, history=HISTORY):
+        self.key = key
+        self.version = time.time_ns() // 1_000_000
+        self.rows = {}
+        self.history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._waiters = []
+
+    def snapshot(self):
+        with self._lock:
+            return {"version": self.version, "snapshot": list(self.rows.values())}
+
+    def publish(self, rows):
+        """Diffs rows against the last snapshot and notifies subscribers. Returns the change list."""
+        with self._lock:
+            current = {}
+            changes = []
+            for row in rows:
+                key = self.key(row)
+                row = dict(row)
+                current[key] = row
+                if self.rows.get(key) != row:
+                    changes.append({"op": "upsert", "key": key, "row": row})
+            for key in self.rows.keys() - current.keys():
+                changes.append({"op": "remove", "key": key})
+            if not changes:
+                return changes
+            self.rows = current
+        self._push(changes)
+        return changes
+
+    def record(self, changes):
+        """Publishes changes the caller already knows (e.g. a single row written by crud.py).
+
+        Unlike publish(), this doesn't diff or touch `rows`, so it suits collections whose
+        full contents live elsewhere, like the users table.
+        """
+        if changes:
+            self._push(changes)
+
+    def _push(self, changes):
+        with self._lock:
+            self.version += 1
+            event = {"version": self.version, "changes": changes}
+            self.history.append(event)
+            subscribers = list(self._subscribers)
+            waiters, self._waiters = self._waiters, []
+        for deliver in subscribers:
+            deliver(event)
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # Waiter's event loop is already closed
+
+    def etag(self, version=None):
+        return f'"{self.version if version is None else version}"'
+
+    def changes_since(self, version):
+        """Returns (current version, changes after `version`), merged per key.
+
+        The change list is None when `version` isn't covered by the retained history.
+        """
+        with self._lock:
+            if version == self.version:
+                return self.version, []
+            floor = self.history[0]["version"] - 1 if self.history else self.version
+            if not floor <= version < self.version:
+                return self.version, None
+            merged = {}
+            for event in self.history:
+                if event["version"] > version:
+                    for change in event["changes"]:
+                        merged.pop(change["key"], None)  # Keep the latest change, in order
+                        merged[change["key"]] = change
+            return self.version, list(merged.values())
+
+    async def wait(self, version, timeout):
+        """Waits up to `timeout` seconds for the feed to move past `version`."""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        with self._lock:
+            if self.version != version:
+                return
+            self._waiters.append((loop, waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if (loop, waiter) in self._waiters:
+                    self._waiters.remove((loop, waiter))
+
+    def subscribe(self):
+        """Returns a thread-safe queue that receives the current snapshot followed by change events."""
+        q = queue.Queue()
+        with self._lock:
+            q.put({"version": self.version, "snapshot": list(self.rows.values())})
+            self._subscribers.append(q.put)
+        return q
+
+    def subscribe_async(self):
+        """Same as subscribe() but returns an asyncio.Queue bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        q = asyncio.Queue()
+
+        def deliver(event):
+            loop.call_soon_threadsafe(q.put_nowait, event)
+
+        q.deliver = deliver
+        with self._lock:
+            q.put_nowait({"version": self.version, "snapshot": list(self.rows.values())})
+            self._subscribers.append(deliver)
+        return q
+
+    def unsubscribe(self, q):
+        deliver = getattr(q, "deliver", None) or q.put
+        with self._lock:
+            if deliver in self._subscribers:
+                self._subscribers.remove(deliver)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _matches(request, etag):
+    header = request.headers.get("if-none-match")
+    return header is not None and (header.strip() == "*" or etag in (tag.strip() for tag in header.split(",")))
+
+
+async def versioned_response(request, feed, load, since=None, wait=0):
+    """Serves a collection backed by `feed` with conditional GET and long-poll support.
+
+    `load()` returns the full collection already encoded as a JSON array (bytes); it runs
+    in the threadpool.
+
+    Without `since`: the full list from `load()`, with a strong
+    ETag; a matching If-None-Match gets a 304 without calling `load` at all.
+    With `since`: {"version", "changes"} holding only the rows changed after that
+    version, waiting up to `wait` seconds for one if there are none yet (304 when the
+    wait runs out), or {"version", "snapshot"} if `since` is too old to replay.
+    """
+    if since is None:
+        version = feed.version  # Read before loading, so the ETag never claims newer data
+        etag = feed.etag(version)
+        headers = {"ETag": etag, "X-Collection-Version": str(version), "Cache-Control": "no-cache"}
+        if _matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(await run_in_threadpool(load), media_type="application/json", headers=headers)
+
+    if wait and since == feed.version:
+        await feed.wait(since, min(wait, MAX_WAIT))
+    version, changes = feed.changes_since(since)
+    headers = {"ETag": feed.etag(version), "X-Collection-Version": str(version), "Cache-Control": "no-cache"}
+    if changes is None:
+        body = b'{"version":%d,"snapshot":%s}' % (version, await run_in_threadpool(load))
+        return Response(body, media_type="application/json", headers=headers)
+    if not changes:
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse({"version": version, "changes": changes}, headers=headers)
+
+
+def apply_event(rows, event, key=server_key):
+    """Applies a snapshot or change event to a {key: row} dict in place (for feed consumers)."""
+    if "snapshot" in event:
+        rows.clear()
+        rows.update((key(row), row) for row in event["snapshot"])
+        return
+    for change in event["changes"]:
+        if change["op"] == "upsert":
+            rows[change["key"]] = change["row"]
+        else:
+            rows.pop(change["key"], None)
+
+
+# Feed of monitored servers, published by ms_app.monitor after every sweep
+server_feed = ChangeFeed()
+
+# Versioned view of the users table; crud.py records every write it makes
+user_feed = ChangeFeed(key=lambda row: row["id"])
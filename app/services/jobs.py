@@ -0,0 +1,196 @@
+import asyncio
+import inspect
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Periodic background jobs, scheduled on the application's own event loop.
+#
+# Each job has an interval, an optional random start jitter, a cap on concurrently
+# running instances (runs beyond it are skipped, not queued), coalescing of runs
+# missed while the loop was busy, and a time budget after which the run is cancelled.
+# Blocking (sync) jobs run on the runner's own thread pool, never on the loop and not
+# on the threadpool that serves sync request handlers.
+
+# Runtime histogram buckets (seconds)
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Threads for blocking jobs
+WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+
+OUTCOMES = ("ok", "failed", "timeout")
+
+
+class Job:
+    def __init__(self, func, interval, name, max_instances, coalesce, jitter, timeout, blocking):
+        self.func = func
+        self.interval = interval
+        self.name = name
+        self.max_instances = max_instances
+        self.coalesce = coalesce
+        self.jitter = jitter
+        self.timeout = timeout
+        self.blocking = blocking
+        self.running = set()
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.skipped = 0  # Due runs dropped because max_instances were already running
+        self.missed = 0  # Runs folded into a later one by coalescing
+        self.buckets = [0] * len(BUCKETS)
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.last_duration = None
+
+    def observe(self, duration, outcome):
+        self.outcomes[outcome] += 1
+        self.duration_sum += duration
+        self.duration_count += 1
+        self.last_duration = duration
+        for i, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "running": len(self.running),
+            "runs": dict(self.outcomes),
+            "skipped": self.skipped,
+            "missed": self.missed,
+            "last_duration": self.last_duration,
+            "mean_duration": self.duration_sum / self.duration_count if self.duration_count else None,
+        }
+
+
+class JobRunner:
+    def __init__(self, workers=WORKERS):
+        self.jobs = {}
+        self.workers = workers
+        self.executor = None
+        self._tasks = []
+
+    def add(self, func, interval, name=None, max_instances=1, coalesce=True, jitter=0.0, timeout=None, blocking=None):
+        """Registers `func` to run every `interval` seconds.
+
+        `blocking` defaults to True for plain functions (run on the job executor) and
+        False for coroutine functions (awaited on the loop). `timeout` cancels an async
+        run; a blocking run can't be interrupted, so it is reported as timed out and keeps
+        its instance slot until the thread returns.
+        """
+        if blocking is None:
+            blocking = not inspect.iscoroutinefunction(func)
+        job = Job(func, interval, name or func.__name__, max_instances, coalesce, jitter, timeout, blocking)
+        self.jobs[job.name] = job
+        return job
+
+    async def start(self):
+        if self._tasks:
+            return
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="job")
+        self._tasks = [asyncio.create_task(self._schedule(job), name=f"job:{job.name}") for job in self.jobs.values()]
+
+    async def stop(self):
+        tasks = self._tasks + [task for job in self.jobs.values() for task in job.running]
+        self._tasks = []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def _schedule(self, job):
+        loop = asyncio.get_running_loop()
+        # Jittered start, so jobs sharing an interval don't all fire on the same tick
+        next_run = loop.time() + random.uniform(0, job.jitter)
+        while True:
+            await asyncio.sleep(max(0.0, next_run - loop.time()))
+            late = loop.time() - next_run
+            missed = int(late // job.interval) if late > 0 else 0
+            next_run += (missed + 1) * job.interval
+            if job.coalesce:
+                job.missed += missed
+                due = 1
+            else:
+                due = missed + 1
+            for _ in range(due):
+                if len(job.running) >= job.max_instances:
+                    job.skipped += 1
+                    logging.warning(f"Job {job.name} skipped: {len(job.running)} instance(s) still running")
+                    continue
+                task = asyncio.create_task(self._run(job))
+                job.running.add(task)
+                task.add_done_callback(job.running.discard)
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            if job.blocking:
+                future = loop.run_in_executor(self.executor, job.func)
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), job.timeout)
+                except asyncio.TimeoutError:
+                    outcome = "timeout"
+                    logging.warning(f"Job {job.name} exceeded {job.timeout}s; waiting for its thread to finish")
+                    await future
+            else:
+                await asyncio.wait_for(job.func(), job.timeout)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            logging.warning(f"Job {job.name} cancelled after {job.timeout}s")
+        except asyncio.CancelledError:
+            outcome = None  # Runner shutting down; not a finished run
+            raise
+        except Exception as e:
+            outcome = "failed"
+            logging.error(f"Job {job.name} failed: {e}")
+        finally:
+            if outcome is not None:
+                job.observe(time.perf_counter() - started, outcome)
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    def exposition(self):
+        """Prometheus text for job runs and runtimes."""
+        lines = [
+            "# HELP job_runs_total Finished background job runs by outcome.",
+            "# TYPE job_runs_total counter",
+        ]
+        for job in self.jobs.values():
+            for outcome, count in job.outcomes.items():
+                lines.append(f'job_runs_total{{job="{job.name}",outcome="{outcome}"}} {count}')
+        lines += [
+            "# HELP job_skipped_total Due runs skipped because max_instances were running.",
+            "# TYPE job_skipped_total counter",
+        ]
+        lines += [f'job_skipped_total{{job="{job.name}"}} {job.skipped}' for job in self.jobs.values()]
+        lines += [
+            "# HELP job_duration_seconds Background job runtime.",
+            "# TYPE job_duration_seconds histogram",
+        ]
+        for job in self.jobs.values():
+            for bound, count in zip(BUCKETS, job.buckets):
+                lines.append(f'job_duration_seconds_bucket{{job="{job.name}",le="{bound}"}} {count}')
+            lines.append(f'job_duration_seconds_bucket{{job="{job.name}",le="+Inf"}} {job.duration_count}')
+            lines.append(f'job_duration_seconds_sum{{job="{job.name}"}} {job.duration_sum:.6f}')
+            lines.append(f'job_duration_seconds_count{{job="{job.name}"}} {job.duration_count}')
+        return "\n".join(lines) + "\n"
+
+    def collect(self):
+        """prometheus_client collector hook, so the runner can be registered with a registry."""
+        from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
+
+        runs = CounterMetricFamily("job_runs", "Finished background job runs by outcome.", labels=["job", "outcome"])
+        skipped = CounterMetricFamily("job_skipped", "Due runs skipped because max_instances were running.", labels=["job"])
+        durations = HistogramMetricFamily("job_duration_seconds", "Background job runtime.", labels=["job"])
+        for job in self.jobs.values():
+            for outcome, count in job.outcomes.items():
+                runs.add_metric([job.name, outcome], count)
+            skipped.add_metric([job.name], job.skipped)
+            buckets = [(str(bound), count) for bound, count in zip(BUCKETS, job.buckets)]
+            buckets.append(("+Inf", job.duration_count))
+            durations.add_metric([job.name], buckets, job.duration_sum)
+        return [runs, skipped, durations]
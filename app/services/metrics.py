@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import defaultdict
+
+# Prometheus exposition for the monitor's own probe results. The text is rendered once
+# per sweep and served as-is, so a scrape costs a memory copy rather than a render.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Probe duration histogram buckets (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Per-target series are only exported up to this many targets; above it only the
+# per-method aggregates are kept, so a large servers.json can't explode cardinality.
+MAX_TARGET_SERIES = int(os.getenv("MONITOR_MAX_TARGET_SERIES", "1000"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _reason(reason):
+    # Collapse HTTP status codes into classes to keep the reason label bounded
+    if reason and reason.startswith("http_") and reason[5:].isdigit():
+        return f"http_{reason[5]}xx"
+    return reason or "unknown"
+
+
+def _target(server):
+    port = server.get("port")
+    return f"{server['host']}:{port}" if port else server["host"]
+
+
+class MonitorMetrics:
+    def __init__(self, max_target_series=MAX_TARGET_SERIES):
+        self.max_target_series = max_target_series
+        self.failures = defaultdict(int)  # (method, reason) -> count
+        self.buckets = defaultdict(lambda: [0] * len(BUCKETS))  # method -> cumulative bucket counts
+        self.duration_sum = defaultdict(float)
+        self.duration_count = defaultdict(int)
+        self.sweeps = 0
+        self._lock = threading.Lock()
+        self.text = self._render([], [], 0.0).encode("utf-8")
+
+    def record_sweep(self, servers, results, sweep_seconds):
+        """Folds one sweep's results into the counters and re-renders the exposition text."""
+        for server, result in zip(servers, results):
+            method = server.get("method", "ping")
+            duration = result.get("duration") or 0.0
+            self.duration_sum[method] += duration
+            self.duration_count[method] += 1
+            counts = self.buckets[method]
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    counts[i] += 1
+            if not result["up"]:
+                self.failures[(method, _reason(result.get("reason")))] += 1
+        self.sweeps += 1
+        text = self._render(servers, results, sweep_seconds).encode("utf-8")
+        with self._lock:
+            self.text = text
+
+    def exposition(self):
+        with self._lock:
+            return self.text
+
+    def _render(self, servers, results, sweep_seconds):
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        targets = defaultdict(lambda: [0, 0])  # method -> [up, total]
+        for server, result in zip(servers, results):
+            counts = targets[server.get("method", "ping")]
+            counts[0] += result["up"]
+            counts[1] += 1
+
+        metric("monitor_targets", "gauge", "Number of monitored targets by method.")
+        for method, (_, total) in sorted(targets.items()):
+            lines.append(f"monitor_targets{_labels(method=method)} {total}")
+        metric("monitor_targets_up", "gauge", "Number of targets whose last probe succeeded, by method.")
+        for method, (up, _) in sorted(targets.items()):
+            lines.append(f"monitor_targets_up{_labels(method=method)} {up}")
+
+        if len(servers) <= self.max_target_series:
+            metric("monitor_target_up", "gauge", "Whether the last probe of the target succeeded.")
+            for server, result in zip(servers, results):
+                labels = _labels(target=_target(server), method=server.get("method", "ping"))
+                lines.append(f"monitor_target_up{labels} {int(result['up'])}")
+            metric("monitor_target_rtt_seconds", "gauge", "Round-trip time of the last successful probe.")
+            for server, result in zip(servers, results):
+                if result["rtt"] is not None:
+                    labels = _labels(target=_target(server), method=server.get("method", "ping"))
+                    lines.append(f"monitor_target_rtt_seconds{labels} {result['rtt']:.6f}")
+            metric("monitor_target_players", "gauge", "Players reported by the last udpquery probe.")
+            for server, result in zip(servers, results):
+                if result.get("players") is not None:
+                    labels = _labels(target=_target(server), method=server.get("method", "ping"))
+                    lines.append(f"monitor_target_players{labels} {result['players']}")
+
+        metric("monitor_probe_duration_seconds", "histogram", "Duration of individual probes.")
+        for method in sorted(self.duration_count):
+            for bound, count in zip(BUCKETS, self.buckets[method]):
+                lines.append(f"monitor_probe_duration_seconds_bucket{_labels(method=method, le=bound)} {count}")
+            lines.append(f"monitor_probe_duration_seconds_bucket{_labels(method=method, le='+Inf')} {self.duration_count[method]}")
+            lines.append(f"monitor_probe_duration_seconds_sum{_labels(method=method)} {self.duration_sum[method]:.6f}")
+            lines.append(f"monitor_probe_duration_seconds_count{_labels(method=method)} {self.duration_count[method]}")
+
+        metric("monitor_probe_failures_total", "counter", "Failed probes by method and reason.")
+        for (method, reason), count in sorted(self.failures.items()):
+            lines.append(f"monitor_probe_failures_total{_labels(method=method, reason=reason)} {count}")
+
+        metric("monitor_sweeps_total", "counter", "Completed monitor sweeps.")
+        lines.append(f"monitor_sweeps_total {self.sweeps}")
+        metric("monitor_sweep_duration_seconds", "gauge", "Duration of the last sweep.")
+        lines.append(f"monitor_sweep_duration_seconds {sweep_seconds:.6f}")
+        metric("monitor_last_sweep_timestamp_seconds", "gauge", "Unix time the last sweep finished.")
+        lines.append(f"monitor_last_sweep_timestamp_seconds {time.time() if self.sweeps else 0:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+# Metrics for ms_app.monitor, served from its /metrics endpoint
+monitor_metrics = MonitorMetrics()
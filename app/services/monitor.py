@@ -0,0 +1,154 @@
+import asyncio
+import sys
+import time
+
+from app.services import udpquery
+
+# Probe engine used by ms_app.monitor: every check is a coroutine, so one sweep probes
+# all targets concurrently instead of blocking on them one after another.
+#
+# It replaced ms_app's blocking check_ping/check_http/check_tcp, and what counts as UP
+# differs from them in a few places:
+#   ping  exit status 0 of `ping -c 1` (`-n 1` on Windows) rather than "TTL=" in its
+#         output, which only matched the Windows ping; now bounded by the probe timeout
+#   http  200 or a 3xx from the target's `port` (default 80); requests.get followed the
+#         redirect and needed a final 200, the probe doesn't follow it
+#   tcp   unchanged: the connection is accepted within the timeout
+# Failures are reported as a `reason` on the result instead of one log line per probe.
+
+DEFAULT_TIMEOUT = 5
+DEFAULT_CONCURRENCY = 500
+
+
+# Extra fields udpquery results carry into the server list
+GAME_FIELDS = ("players", "max_players", "map")
+
+
+def _result(up, started, reason=None):
+    """Probe outcome: reachability, round-trip time and probe duration in seconds, failure reason."""
+    duration = time.perf_counter() - started
+    return {"up": up, "rtt": duration if up else None, "duration": duration, "reason": reason}
+
+
+def _reason(exc):
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    if isinstance(exc, ConnectionRefusedError):
+        return "refused"
+    if isinstance(exc, ConnectionResetError):
+        return "reset"
+    return "error"
+
+
+async def probe_tcp(host, port, timeout=DEFAULT_TIMEOUT):
+    started = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except Exception as e:
+        return _result(False, started, _reason(e))
+    result = _result(True, started)
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return result
+
+
+async def probe_http(host, port=80, timeout=DEFAULT_TIMEOUT):
+    started = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(f"GET / HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        parts = status_line.split()
+        status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+        # 200 as before the async engine; a redirect counts too (the old requests.get followed
+        # it), but other 2xx don't
+        if status == 200 or 300 <= status < 400:
+            return _result(True, started)
+        return _result(False, started, f"http_{status}" if status else "bad_response")
+    except Exception as e:
+        return _result(False, started, _reason(e))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def probe_ping(host, timeout=DEFAULT_TIMEOUT):
+    started = time.perf_counter()
+    count_flag = "-n" if sys.platform.startswith("win") else "-c"
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ping", count_flag, "1", host,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+    except Exception as e:
+        return _result(False, started, _reason(e))
+    try:
+        returncode = await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        return _result(False, started, "timeout")
+    finally:
+        if process.returncode is None:  # Timed out, or the sweep was cancelled
+            process.kill()
+            await process.wait()  # Reap it, or it stays a zombie until the loop closes
+    return _result(returncode == 0, started, None if returncode == 0 else "unreachable")
+
+
+async def probe_udpquery(host, port=udpquery.DEFAULT_PORT, timeout=DEFAULT_TIMEOUT):
+    """Game-server query over the shared UDP socket; also reports players, slots and map."""
+    started = time.perf_counter()
+    try:
+        query_client = await udpquery.client()
+        info, rtt = await query_client.query(host, port, timeout)
+    except Exception as e:
+        result = _result(False, started, _reason(e))
+        result.update(dict.fromkeys(GAME_FIELDS))
+        return result
+    result = _result(True, started)
+    result["rtt"] = rtt
+    result.update(info)
+    return result
+
+
+async def probe(server, timeout=DEFAULT_TIMEOUT):
+    """Checks one servers.json entry with its configured method (ping, http, tcp, udpquery)."""
+    host = server["host"]
+    method = server.get("method", "ping")
+    if method == "udpquery":
+        return await probe_udpquery(host, server.get("port", udpquery.DEFAULT_PORT), timeout)
+    port = server.get("port", 80)
+    if method == "ping":
+        return await probe_ping(host, timeout)
+    if method == "http":
+        return await probe_http(host, port, timeout)
+    if method == "tcp":
+        return await probe_tcp(host, port, timeout)
+    return {"up": False, "rtt": None, "duration": 0.0, "reason": "unknown_method"}
+
+
+async def sweep(servers, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+    """Probes all servers concurrently and records the outcome on each entry (see apply_result).
+
+    Returns the list of probe results in the same order as `servers`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(server):
+        async with semaphore:
+            return await probe(server, timeout)
+
+    results = await asyncio.gather(*(bounded(server) for server in servers))
+    for server, result in zip(servers, results):
+        apply_result(server, result)
+    return results
+
+
+def apply_result(server, result):
+    """Records a probe result on its servers.json entry: status, plus players/map for udpquery."""
+    server["status"] = "UP" if result["up"] else "DOWN"
+    for field in GAME_FIELDS:
+        if field in result:
+            server[field] = result[field]
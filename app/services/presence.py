@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, update
+
+from app.database import SessionLocal, scatter
+from app.models import User
+
+# Presence tracking. Logins, WebSocket connections and heartbeats only touch an
+# in-memory dict; users count as active while their last activity is inside the
+# sliding window. users.last_login is written by a periodic flush, one batched
+# UPDATE for everyone seen since the previous flush, however often they were seen.
+
+WINDOW = float(os.getenv("PRESENCE_WINDOW", "300"))  # Seconds a user stays active after the last activity
+FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", "5"))
+
+_users = User.__table__
+FLUSH_STATEMENT = (
+    update(_users)
+    .where(_users.c.username == bindparam("name"))
+    .values(last_login=bindparam("seen"))
+)
+
+
+def _utc(timestamp):
+    # Naive UTC, like the rest of users' DateTime columns
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class PresenceTracker:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.seen = OrderedDict()  # username -> last activity (unix time), least recent first
+        self.pending = {}  # username -> last activity not yet written to the database
+        self.flushed = 0
+        self._lock = threading.Lock()
+
+    def touch(self, username, now=None):
+        """Records activity for `username` (login, WebSocket connect or heartbeat)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.seen[username] = now
+            self.seen.move_to_end(username)
+            self.pending[username] = now
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        while self.seen:
+            username, seen = next(iter(self.seen.items()))
+            if seen >= cutoff:
+                break
+            del self.seen[username]
+
+    def active(self, now=None):
+        """Active users as (username, last activity) pairs, most recent first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            items = list(reversed(self.seen.items()))
+        return [(username, _utc(seen)) for username, seen in items]
+
+    def count(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            return len(self.seen)
+
+    def flush(self, session_factory=SessionLocal):
+        """Writes pending activity to users.last_login in one batch; returns the number of users written."""
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        rows = [{"name": username, "seen": _utc(seen)} for username, seen in pending.items()]
+
+        def write(db):
+            db.execute(FLUSH_STATEMENT, rows)
+            db.commit()
+
+        try:
+            with session_factory() as db:
+                scatter(db, write)  # Every shard gets the batch; users elsewhere match no rows
+        except Exception:
+            with self._lock:
+                # Retry next time, unless newer activity arrived in the meantime
+                for username, seen in pending.items():
+                    if self.pending.get(username, 0) < seen:
+                        self.pending[username] = seen
+            raise
+        self.flushed += len(rows)
+        return len(rows)
+
+
+# Shared tracker for the API (login, /ws, heartbeats, /active_users); main.py schedules presence.flush
+presence = PresenceTracker()
+
@@ -0,0 +1,191 @@
+import json
+import struct
+import zlib
+
+try:
+    import msgpack  # Optional dependency, only offered to clients when installed
+except ImportError:
+    msgpack = None
+
+# WebSocket subprotocols understood by the server. JSON is the fallback and
+# stays byte-for-byte compatible with clients that do not negotiate anything.
+JSON = "ms.json"
+MSGPACK = "ms.msgpack"
+STRUCT = "ms.struct"
+DEFLATE_SUFFIX = "+deflate"
+
+# Frame types for the struct protocol
+FRAME_USERS = 1
+FRAME_SERVERS = 2
+
+# Enumerations used instead of repeating strings in every record
+PING_COLORS = ["green", "yellow", "red"]
+METHODS = ["ping", "http", "tcp", "udpquery"]
+STATUSES = [None, "UP", "DOWN"]
+
+# Frame header: type, flags, string count, record count
+_HEADER = struct.Struct("<BBII")
+# User record: id, username index, ping (NULL_PING when unknown), color
+_USER = struct.Struct("<IIHB")
+NULL_PING = 0xFFFF
+# Server record: host index, method, port, status
+_SERVER = struct.Struct("<IBHB")
+_STRLEN = struct.Struct("<H")
+
+USER_FIELDS = ["id", "username", "ping", "color"]
+SERVER_FIELDS = ["host", "method", "port", "status"]
+
+
+def supported_protocols():
+    """Returns the subprotocols the server can speak, in preference order."""
+    base = [STRUCT] + ([MSGPACK] if msgpack is not None else []) + [JSON]
+    return [p + DEFLATE_SUFFIX for p in base if p != JSON] + base
+
+
+def negotiate(offered):
+    """Picks the first protocol offered by the client that the server supports."""
+    supported = set(supported_protocols())
+    for protocol in offered or []:
+        if protocol in supported:
+            return protocol
+    return None
+
+
+async def accept(websocket):
+    """Accepts the WebSocket with a negotiated subprotocol and returns it (JSON if none)."""
+    protocol = negotiate(websocket.scope.get("subprotocols"))
+    await websocket.accept(subprotocol=protocol)
+    return protocol or JSON
+
+
+async def send_frame(websocket, frame):
+    """Sends an already encoded frame as text or binary depending on its type."""
+    if isinstance(frame, bytes):
+        await websocket.send_bytes(frame)
+    else:
+        await websocket.send_text(frame)
+
+
+class _StringTable:
+    """Interns strings so every distinct username/host is sent only once per frame."""
+
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def add(self, value):
+        value = value or ""
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return idx
+
+    def pack(self):
+        parts = []
+        for value in self.strings:
+            # Longer strings are cut to the length field, on a character boundary
+            raw = value.encode("utf-8")[:0xFFFF].decode("utf-8", "ignore").encode("utf-8")
+            parts.append(_STRLEN.pack(len(raw)))
+            parts.append(raw)
+        return b"".join(parts)
+
+
+def _split(protocol):
+    if protocol.endswith(DEFLATE_SUFFIX):
+        return protocol[: -len(DEFLATE_SUFFIX)], True
+    return protocol, False
+
+
+def _deflate(payload):
+    # Raw deflate stream (no zlib header), decodable with wbits=-15
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(payload) + compressor.flush()
+
+
+def _finish(payload, deflate):
+    return _deflate(payload) if deflate else payload
+
+
+def _enum(values, value):
+    try:
+        return values.index(value)
+    except ValueError:
+        raise ValueError(f"{value!r} is not one of {values}") from None
+
+
+def _ping(ping):
+    return NULL_PING if ping is None else min(max(ping, 0), NULL_PING - 1)
+
+
+def encode_users(rows, protocol=JSON):
+    """Encodes (id, username, ping, color) rows for the given subprotocol."""
+    base, deflate = _split(protocol)
+    if base == STRUCT:
+        table = _StringTable()
+        records = b"".join(
+            _USER.pack(user_id, table.add(username), _ping(ping), _enum(PING_COLORS, color))
+            for user_id, username, ping, color in rows
+        )
+        header = _HEADER.pack(FRAME_USERS, 0, len(table.strings), len(rows))
+        return _finish(header + table.pack() + records, deflate)
+    if base == MSGPACK:
+        payload = msgpack.packb({"type": "users", "fields": USER_FIELDS, "rows": [list(r) for r in rows]})
+        return _finish(payload, deflate)
+    return json.dumps([dict(zip(USER_FIELDS, row)) for row in rows], separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_servers(servers, protocol=JSON):
+    """Encodes the monitored server list (dicts from servers.json) for the given subprotocol."""
+    base, deflate = _split(protocol)
+    if base == STRUCT:
+        table = _StringTable()
+        records = b"".join(
+            _SERVER.pack(
+                table.add(s["host"]),
+                _enum(METHODS, s.get("method", "ping")),
+                s.get("port", 0) or 0,
+                _enum(STATUSES, s.get("status")),
+            )
+            for s in servers
+        )
+        header = _HEADER.pack(FRAME_SERVERS, 0, len(table.strings), len(servers))
+        return _finish(header + table.pack() + records, deflate)
+    if base == MSGPACK:
+        rows = [[s["host"], s.get("method", "ping"), s.get("port"), s.get("status")] for s in servers]
+        return _finish(msgpack.packb({"type": "servers", "fields": SERVER_FIELDS, "rows": rows}), deflate)
+    return json.dumps(servers)
+
+
+def decode_frame(data, protocol=JSON):
+    """Decodes a frame back into a list of dicts (reference decoder for clients and tests)."""
+    base, deflate = _split(protocol)
+    if base == JSON:
+        return json.loads(data)
+    if deflate:
+        data = zlib.decompress(data, -15)
+    if base == MSGPACK:
+        message = msgpack.unpackb(data)
+        return [dict(zip(message["fields"], row)) for row in message["rows"]]
+
+    frame_type, _flags, string_count, record_count = _HEADER.unpack_from(data, 0)
+    offset = _HEADER.size
+    strings = []
+    for _ in range(string_count):
+        (length,) = _STRLEN.unpack_from(data, offset)
+        offset += _STRLEN.size
+        strings.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+
+    result = []
+    if frame_type == FRAME_USERS:
+        for user_id, name_idx, ping, color in _USER.iter_unpack(data[offset:offset + record_count * _USER.size]):
+            result.append({"id": user_id, "username": strings[name_idx], "ping": None if ping == NULL_PING else ping,
+                           "color": PING_COLORS[color]})
+    elif frame_type == FRAME_SERVERS:
+        for host_idx, method, port, status in _SERVER.iter_unpack(data[offset:offset + record_count * _SERVER.size]):
+            server = {"host": strings[host_idx], "method": METHODS[method], "port": port}
+            if STATUSES[status]:
+                server["status"] = STATUSES[status]
+            result.append(server)
+    return result
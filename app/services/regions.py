@@ -0,0 +1,188 @@
+import ipaddress
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from app.models import VALID_REGIONS
+
+# Latency-based region assignment.
+#
+# Clients measure RTT against each region's probe endpoint and report the samples.
+# Every user keeps an exponentially smoothed latency vector (region -> ms), and the
+# same samples are folded into per-network aggregates (/24 for IPv4, /48 for IPv6)
+# whose best region is written into a radix trie. New clients without samples get
+# the best region of the longest matching prefix.
+
+ALPHA = float(os.getenv("REGION_EWMA_ALPHA", "0.3"))  # Weight of the newest sample
+# Samples above this (ms), like non-finite ones, are discarded as bogus
+MAX_RTT = float(os.getenv("REGION_MAX_RTT", "10000"))
+# Latency vectors kept; the users/networks that reported least recently are forgotten first
+MAX_USERS = int(os.getenv("REGION_MAX_USERS", "100000"))
+MAX_NETWORKS = int(os.getenv("REGION_MAX_NETWORKS", "100000"))
+IPV4_AGGREGATE = 24
+IPV6_AGGREGATE = 48
+# Optional seed table: {"203.0.113.0/24": "EU", ...}
+PREFIXES_FILE = os.getenv("REGION_PREFIXES_FILE", "regions.json")
+# Per-region probe endpoints, e.g. {"EU": "https://eu.example.com/regions/probe/EU"}
+REGION_PROBE_URLS = json.loads(os.getenv("REGION_PROBE_URLS", "{}"))
+
+
+class RegionTrie:
+    """Binary radix trie for longest-prefix matching of IPv4/IPv6 addresses.
+
+    Nodes are [child0, child1, value] lists; a lookup walks at most 32 (IPv4) or
+    128 (IPv6) levels, remembering the deepest value seen.
+    """
+
+    def __init__(self):
+        self.roots = {4: [None, None, None], 6: [None, None, None]}
+        self.size = 0
+
+    def insert(self, network, value):
+        network = ipaddress.ip_network(network, strict=False)
+        bits = network.max_prefixlen
+        address = int(network.network_address)
+        node = self.roots[network.version]
+        for i in range(network.prefixlen):
+            bit = (address >> (bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            self.size += 1
+        node[2] = value
+
+    def remove(self, network):
+        """Drops the value stored for exactly `network`, pruning nodes left without use."""
+        network = ipaddress.ip_network(network, strict=False)
+        bits = network.max_prefixlen
+        address = int(network.network_address)
+        path = [self.roots[network.version]]
+        for i in range(network.prefixlen):
+            node = path[-1][(address >> (bits - 1 - i)) & 1]
+            if node is None:
+                return
+            path.append(node)
+        if path[-1][2] is None:
+            return
+        path[-1][2] = None
+        self.size -= 1
+        for i in range(network.prefixlen, 0, -1):
+            node = path[i]
+            if node[0] is not None or node[1] is not None or node[2] is not None:
+                break
+            path[i - 1][(address >> (bits - i)) & 1] = None
+
+    def lookup(self, address):
+        """Returns the value of the longest prefix containing `address`, or None."""
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return None
+        bits = address.max_prefixlen
+        value = int(address)
+        node = self.roots[address.version]
+        best = node[2]
+        for i in range(bits):
+            node = node[(value >> (bits - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                best = node[2]
+        return best
+
+
+def _smooth(vector, region, rtt):
+    previous = vector.get(region)
+    vector[region] = rtt if previous is None else previous + ALPHA * (rtt - previous)
+
+
+def _best(vector):
+    region = min(vector, key=vector.get)
+    return region, vector[region]
+
+
+def _recent(table, key, limit):
+    # table[key] (created empty) marked as most recently used; returns it and the keys evicted past `limit`
+    vector = table.pop(key, None)
+    table[key] = vector if vector is not None else {}
+    evicted = []
+    while len(table) > limit:
+        evicted.append(table.popitem(last=False)[0])
+    return table[key], evicted
+
+
+def aggregate_network(address):
+    """The network that samples from `address` are aggregated under."""
+    address = ipaddress.ip_address(address)
+    prefix = IPV4_AGGREGATE if address.version == 4 else IPV6_AGGREGATE
+    return ipaddress.ip_network(f"{address}/{prefix}", strict=False)
+
+
+class RegionAssigner:
+    def __init__(self, prefixes_file=PREFIXES_FILE, max_users=MAX_USERS, max_networks=MAX_NETWORKS):
+        self.users = OrderedDict()  # username -> {region: smoothed rtt ms}, least recently reported first
+        self.networks = OrderedDict()  # network -> {region: smoothed rtt ms}, likewise
+        self.max_users = max_users
+        self.max_networks = max_networks
+        self.trie = RegionTrie()
+        self._lock = threading.Lock()
+        self.load_prefixes(prefixes_file)
+
+    def load_prefixes(self, path):
+        """Seeds the trie from a {cidr: region} JSON file, if present."""
+        try:
+            with open(path, "r") as f:
+                table = json.load(f)
+        except FileNotFoundError:
+            return
+        for cidr, region in table.items():
+            if region in VALID_REGIONS:
+                self.trie.insert(cidr, (region, None))
+
+    def record(self, username, address, samples):
+        """Folds {region: rtt_ms} samples into the user's and the client network's vectors.
+
+        Returns the user's (best region, smoothed rtt).
+        """
+        samples = {region: float(rtt) for region, rtt in samples.items()
+                   if region in VALID_REGIONS and math.isfinite(rtt) and 0 <= rtt <= MAX_RTT}
+        if not samples:
+            raise ValueError(f"Samples must be RTTs for regions in: {', '.join(VALID_REGIONS)}")
+        with self._lock:
+            vector = _recent(self.users, username, self.max_users)[0] if username else {}
+            for region, rtt in samples.items():
+                _smooth(vector, region, rtt)
+            if address:
+                try:
+                    network = aggregate_network(address)
+                except ValueError:
+                    network = None
+                if network is not None:
+                    aggregate, evicted = _recent(self.networks, network, self.max_networks)
+                    for region, rtt in samples.items():
+                        _smooth(aggregate, region, rtt)
+                    # Keep the precomputed prefix -> best region table current
+                    self.trie.insert(network, _best(aggregate))
+                    for stale in evicted:
+                        self.trie.remove(stale)
+            return _best(vector if vector else samples)
+
+    def assign(self, username, address, fallback=None):
+        """Best (region, expected ping ms) for a user: own samples, then network prefix, then fallback."""
+        with self._lock:
+            vector = self.users.get(username)
+            if vector:
+                self.users.move_to_end(username)  # Users who log in stay, idle ones are evicted first
+                return _best(vector)
+            if address:
+                match = self.trie.lookup(address)
+                if match is not None:
+                    return match
+        return fallback, None
+
+
+# Shared assigner used by the login and region sample endpoints
+region_assigner = RegionAssigner()
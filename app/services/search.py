@@ -0,0 +1,178 @@
+import bisect
+import heapq
+import threading
+from array import array
+from itertools import islice
+
+from sqlalchemy import case, func, select, text
+
+from app.database import SessionLocal, scatter, stream
+from app.models import User
+
+# Username/email prefix search for /users/search.
+#
+# Lowercased usernames and emails are kept in two sorted arrays (key list plus a parallel
+# array of user ids), so a prefix is one bisect to the start of its range and the page is
+# a slice of it: O(log n + page) per query, and a fraction of the memory of a per-character
+# trie or trigram postings at a million users. The index is loaded at startup and kept
+# current by crud.publish_user / publish_users_removed, which every user write goes through.
+
+MAX_LIMIT = 100
+_END = "\U0010ffff"  # Sorts after every character, so key + _END bounds a prefix range
+
+
+class UserSearchIndex:
+    def __init__(self):
+        self.users = {}  # user id -> (username, email)
+        self.username_keys, self.username_ids = [], array("q")
+        self.email_keys, self.email_ids = [], array("q")
+        self.ready = False  # Until the first load, searches go to the database
+        self._pending = None  # Writes made while a load is streaming, replayed onto its result
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _insert(keys, ids, key, user_id):
+        index = bisect.bisect_left(keys, key)
+        keys.insert(index, key)
+        ids.insert(index, user_id)
+
+    @staticmethod
+    def _delete(keys, ids, key, user_id):
+        index = bisect.bisect_left(keys, key)
+        while index < len(keys) and keys[index] == key:
+            if ids[index] == user_id:
+                del keys[index]
+                del ids[index]
+                return
+            index += 1
+
+    def _remove(self, user_id):
+        previous = self.users.pop(user_id, None)
+        if previous is None:
+            return
+        username, email = previous
+        if username:
+            self._delete(self.username_keys, self.username_ids, username.lower(), user_id)
+        if email:
+            self._delete(self.email_keys, self.email_ids, email.lower(), user_id)
+
+    def _upsert(self, user_id, username, email):
+        if self.users.get(user_id) == (username, email):
+            return
+        self._remove(user_id)
+        self.users[user_id] = (username, email)
+        if username:
+            self._insert(self.username_keys, self.username_ids, username.lower(), user_id)
+        if email:
+            self._insert(self.email_keys, self.email_ids, email.lower(), user_id)
+
+    def upsert(self, user_id, username, email=None):
+        """Indexes a created or renamed user."""
+        with self._lock:
+            self._upsert(user_id, username, email)
+            if self._pending is not None:
+                self._pending.append((user_id, username, email))
+
+    def remove(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._remove(user_id)
+                if self._pending is not None:
+                    self._pending.append((user_id, None, None))
+
+    def load(self, session_factory=SessionLocal, batch=10000):
+        """Rebuilds the index from the users table (every shard): one sort instead of n inserts."""
+        with self._lock:
+            self._pending = []
+        try:
+            statement = (
+                select(User.id, User.username, User.email)
+                .order_by(User.id)
+                .execution_options(yield_per=batch)
+            )
+            with session_factory() as db:
+                users = {user_id: (username, email) for user_id, username, email in stream(db, statement, key=lambda row: row.id)}
+            by_username = sorted((username.lower(), user_id) for user_id, (username, _) in users.items() if username)
+            by_email = sorted((email.lower(), user_id) for user_id, (_, email) in users.items() if email)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self.users = users
+            self.username_keys = [key for key, _ in by_username]
+            self.username_ids = array("q", (user_id for _, user_id in by_username))
+            self.email_keys = [key for key, _ in by_email]
+            self.email_ids = array("q", (user_id for _, user_id in by_email))
+            # Replay writes that raced the stream (upserts and removals are idempotent by id)
+            for user_id, username, email in self._pending:
+                if username is None and email is None:
+                    self._remove(user_id)
+                else:
+                    self._upsert(user_id, username, email)
+            self._pending = None
+            self.ready = True
+        return len(users)
+
+    def search(self, query, limit=20, offset=0):
+        """Ranked page of users whose username or email starts with `query` (case-insensitive).
+
+        Username matches come first (alphabetically, so an exact match leads), then email
+        matches of users not already listed. Returns (results, more).
+        """
+        query = query.strip().lower()
+        results = []
+        with self._lock:
+            start = bisect.bisect_left(self.username_keys, query)
+            end = bisect.bisect_left(self.username_keys, query + _END, start)
+            for index in range(start + offset, min(end, start + offset + limit + 1)):
+                user_id = self.username_ids[index]
+                results.append({"id": user_id, "username": self.users[user_id][0], "matched": "username"})
+            skip = max(0, offset - (end - start))
+            index = bisect.bisect_left(self.email_keys, query)
+            while len(results) <= limit and index < len(self.email_keys) and self.email_keys[index].startswith(query):
+                user_id = self.email_ids[index]
+                username = self.users[user_id][0]
+                index += 1
+                if username and username.lower().startswith(query):
+                    continue  # Already listed as a username match
+                if skip:
+                    skip -= 1
+                    continue
+                results.append({"id": user_id, "username": username, "matched": "email"})
+        return results[:limit], len(results) > limit
+
+
+def search_database(db, query, limit=20, offset=0):
+    """Same ranking straight from the database (merged across shards), used until the index has loaded."""
+    pattern = query.strip().lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    username = func.lower(User.username).like(pattern, escape="\\")
+    email = func.lower(User.email).like(pattern, escape="\\")
+    # Username matches by username, email matches by email, like the index's two arrays
+    sort_key = case((username, func.lower(User.username)), else_=func.lower(User.email))
+    statement = (
+        select(User.id, User.username, username, sort_key)
+        .where(username | email)
+        .order_by(username.desc(), sort_key)
+        .limit(offset + limit + 1)
+    )
+    parts = scatter(db, lambda shard: shard.execute(statement).all())
+    rows = islice(heapq.merge(*parts, key=lambda row: (not row[2], row[3] or "")), offset, offset + limit + 1)
+    results = [{"id": user_id, "username": name, "matched": "username" if by_name else "email"}
+               for user_id, name, by_name, _ in rows]
+    return results[:limit], len(results) > limit
+
+
+def create_trigram_indexes(engine):
+    """Postgres only: pg_trgm GIN indexes on lower(username)/lower(email), which serve the
+    LIKE prefix (and substring) patterns of search_database."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (lower(username) gin_trgm_ops)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops)"))
+
+
+# Shared index behind /users/search; main.py loads it at startup, crud.py keeps it current
+search_index = UserSearchIndex()
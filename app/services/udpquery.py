@@ -0,0 +1,147 @@
+import asyncio
+import ipaddress
+import random
+import socket
+import struct
+import time
+import weakref
+
+# UDP game-server query ("udpquery" targets in servers.json).
+#
+# One packet each way: the monitor sends a query carrying a request id, the game server
+# answers with the same id plus its player count, slot count and current map. All
+# queries of a sweep share one non-blocking socket per event loop; responses are
+# matched to the waiting probe by request id (and source address), so thousands of
+# outstanding queries cost one file descriptor and no threads.
+#
+#   query:    b"MSQ\x01" | request id (u32)
+#   response: b"MSR\x01" | request id (u32) | players (u16) | max players (u16) | map length (u8) | map (utf-8)
+
+DEFAULT_PORT = 27015
+QUERY_MAGIC = b"MSQ\x01"
+RESPONSE_MAGIC = b"MSR\x01"
+RECEIVE_BUFFER = 4 * 2**20  # Bursts of responses from a large sweep arrive faster than they're read
+
+_QUERY = struct.Struct("!4sI")
+_RESPONSE = struct.Struct("!4sIHHB")
+
+
+def encode_query(request_id):
+    return _QUERY.pack(QUERY_MAGIC, request_id)
+
+
+def decode_query(data):
+    """The request id of a query packet, or None if it isn't one."""
+    if len(data) != _QUERY.size:
+        return None
+    magic, request_id = _QUERY.unpack(data)
+    return request_id if magic == QUERY_MAGIC else None
+
+
+def encode_response(request_id, players, max_players, map_name):
+    name = map_name.encode("utf-8")[:255]
+    return _RESPONSE.pack(RESPONSE_MAGIC, request_id, players, max_players, len(name)) + name
+
+
+def decode_response(data):
+    """(request id, {"players", "max_players", "map"}) for a response packet, or None if malformed."""
+    if len(data) < _RESPONSE.size:
+        return None
+    magic, request_id, players, max_players, length = _RESPONSE.unpack_from(data)
+    if magic != RESPONSE_MAGIC or len(data) != _RESPONSE.size + length:
+        return None
+    map_name = data[_RESPONSE.size:].decode("utf-8", "replace")
+    return request_id, {"players": players, "max_players": max_players, "map": map_name}
+
+
+class QueryClient(asyncio.DatagramProtocol):
+    """Shared UDP socket with a table of outstanding queries keyed by request id."""
+
+    def __init__(self):
+        self.transport = None
+        self.pending = {}  # request id -> (future, address)
+        self.addresses = {}  # host -> resolved IPv4 address
+        self._next_id = random.getrandbits(32)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        received = time.perf_counter()
+        response = decode_response(data)
+        if response is None:
+            return
+        request_id, info = response
+        entry = self.pending.get(request_id)
+        # Late answers to timed-out queries, or stray packets from elsewhere, are dropped
+        if entry is None or entry[1] != addr[:2] or entry[0].done():
+            return
+        entry[0].set_result((info, received))
+
+    def error_received(self, exc):
+        pass  # ICMP errors on an unconnected socket can't be tied to a query; it times out instead
+
+    def connection_lost(self, exc):
+        for future, _ in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("query socket closed"))
+        self.pending.clear()
+
+    async def _resolve(self, host):
+        address = self.addresses.get(host)
+        if address is None:
+            try:
+                address = str(ipaddress.IPv4Address(host))
+            except ValueError:
+                infos = await asyncio.get_running_loop().getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+                address = infos[0][4][0]
+            self.addresses[host] = address
+        return address
+
+    def _request_id(self):
+        while True:
+            self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+            if self._next_id not in self.pending:
+                return self._next_id
+
+    async def query(self, host, port=DEFAULT_PORT, timeout=5):
+        """Sends one query; returns ({"players", "max_players", "map"}, rtt seconds)."""
+        address = (await self._resolve(host), port)
+        request_id = self._request_id()
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = (future, address)
+        try:
+            sent = time.perf_counter()
+            self.transport.sendto(encode_query(request_id), address)
+            info, received = await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+        return info, received - sent
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> task creating its QueryClient
+
+
+async def _open_client():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+    except OSError:
+        pass
+    sock.bind(("0.0.0.0", 0))
+    sock.setblocking(False)
+    _, client = await asyncio.get_running_loop().create_datagram_endpoint(QueryClient, sock=sock)
+    return client
+
+
+async def client():
+    """The running loop's shared QueryClient, opened on first use."""
+    loop = asyncio.get_running_loop()
+    task = _clients.get(loop)
+    if task is None or (task.done() and (task.exception() or task.result().transport.is_closing())):
+        task = _clients[loop] = loop.create_task(_open_client())
+    return await asyncio.shield(task)
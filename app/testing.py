@@ -0,0 +1,104 @@
+import contextlib
+import functools
+import os
+
+# Test harness: the app on an in-memory SQLite database (one shared connection, see
+# app.database), each test inside a transaction that is rolled back afterwards, with every
+# session dependency pointed at it. Nothing touches disk, Postgres or the background jobs,
+# so the suite runs in seconds and tests can't see each other's rows; each pytest-xdist
+# worker is its own process with its own database, so `-n auto` works as is. The bench
+# (app/bench) sets up its environment through the same configure_environment().
+#
+#   python -m pytest -q
+
+# Password of every user made by create_user unless given; hashed once per value
+TEST_PASSWORD = "test-password"
+
+
+def configure_environment(database_url="sqlite://"):
+    """Points the app at `database_url` (default: in-memory SQLite) with background jobs,
+    sharding and replicas disabled.
+
+    Must be called before any app module is imported, since app.database builds its
+    engine at import time.
+    """
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQL_ECHO"] = "false"
+    os.environ["BACKGROUND_JOBS"] = "false"
+    os.environ["SHARDED_STORAGE"] = "false"
+    os.environ["REPLICA_URLS"] = ""
+    return database_url
+
+
+@functools.lru_cache(maxsize=None)
+def load_app():
+    """Imports the app once per process, which also creates the tables; must happen before
+    any test transaction opens on the shared connection."""
+    from app.main import app
+
+    return app
+
+
+@contextlib.contextmanager
+def transactional_session():
+    """A session whose work, commits included, is rolled back on exit."""
+    from sqlalchemy.orm import Session
+    from app.database import engine
+
+    load_app()
+    connection = engine.connect()
+    transaction = connection.begin()
+    # The app's commits release a SAVEPOINT instead of ending the outer transaction
+    session = Session(bind=connection, autoflush=False, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def override_dependencies(app, session):
+    """Serves `session` from every session dependency (write, read and the module-local ones)."""
+    from app import database, routers, security
+
+    def get_session():
+        yield session
+
+    for dependency in (database.get_db, database.get_read_db, routers.get_db, security.get_db):
+        app.dependency_overrides[dependency] = get_session
+
+
+@contextlib.contextmanager
+def api_client(session):
+    """TestClient for the app on `session`.
+
+    The lifespan isn't run, so no jobs start and the in-memory indexes (availability,
+    search) stay unloaded: every lookup goes to the session and sees only this test's rows.
+    """
+    from fastapi.testclient import TestClient
+
+    app = load_app()
+    override_dependencies(app, session)
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def password_hash(password):
+    from app.auth import get_password_hash
+
+    return get_password_hash(password)
+
+
+def create_user(session, username, password=TEST_PASSWORD, region="EU", ping=50, **fields):
+    """Inserts a user straight into `session` (bypassing the API) and returns it."""
+    from app.models import User
+
+    user = User(username=username, email=fields.pop("email", f"{username}@example.com"),
+                hashed_password=password_hash(password), region=region, ping=ping, **fields)
+    session.add(user)
+    session.commit()
+    return user
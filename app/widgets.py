@@ -0,0 +1,109 @@
+import tkinter as tk
+
+
+class VirtualListbox(tk.Frame):
+    """Listbox that only renders the visible window of a large, keyed row set.
+
+    Rows are kept in memory as {key: (text, color)}; the underlying tk.Listbox holds
+    just `height` items, so updating or scrolling through thousands of servers touches
+    a handful of widget rows instead of rebuilding the whole list.
+    """
+
+    def __init__(self, master, height=15, **listbox_options):
+        super().__init__(master, bg=listbox_options.get("bg"))
+        self.height = height
+        self.keys = []  # Row order
+        self.positions = {}  # key -> index in self.keys
+        self.items = {}  # key -> (text, color)
+        self.top = 0
+
+        self.listbox = tk.Listbox(self, height=height, **listbox_options)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        self.listbox.bind("<Button-4>", lambda e: self.scroll_to(self.top - 3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll_to(self.top + 3))
+        self.listbox.bind("<Configure>", self._on_resize)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def set_row(self, key, text, color=None):
+        """Inserts or updates a row; only redraws it if it is currently visible."""
+        if self.items.get(key) == (text, color):
+            return
+        self.items[key] = (text, color)
+        if key in self.positions:
+            index = self.positions[key]
+            if self.top <= index < self.top + self.height:
+                self._draw_row(index - self.top, key)
+        else:
+            self.positions[key] = len(self.keys)
+            self.keys.append(key)
+            if len(self.keys) <= self.top + self.height:
+                self._draw_row(len(self.keys) - 1 - self.top, key)
+            self._update_scrollbar()
+
+    def remove_row(self, key):
+        if key not in self.positions:
+            return
+        index = self.positions.pop(key)
+        del self.keys[index]
+        del self.items[key]
+        for i in range(index, len(self.keys)):
+            self.positions[self.keys[i]] = i
+        if index < self.top + self.height:
+            self.redraw()
+        else:
+            self._update_scrollbar()
+
+    def clear(self):
+        self.keys.clear()
+        self.positions.clear()
+        self.items.clear()
+        self.top = 0
+        self.redraw()
+
+    def scroll_to(self, top):
+        top = max(0, min(int(top), max(len(self.keys) - self.height, 0)))
+        if top != self.top:
+            self.top = top
+            self.redraw()
+
+    def redraw(self):
+        self.listbox.delete(0, tk.END)
+        for offset, key in enumerate(self.keys[self.top:self.top + self.height]):
+            self._draw_row(offset, key)
+        self._update_scrollbar()
+
+    def _draw_row(self, offset, key):
+        text, color = self.items[key]
+        if offset < self.listbox.size():
+            self.listbox.delete(offset)
+        self.listbox.insert(offset, text)
+        if color:
+            self.listbox.itemconfig(offset, fg=color)
+
+    def _update_scrollbar(self):
+        total = max(len(self.keys), 1)
+        self.scrollbar.set(self.top / total, min((self.top + self.height) / total, 1.0))
+
+    def _on_scroll(self, action, amount, unit=None):
+        if action == tk.MOVETO:
+            self.scroll_to(float(amount) * len(self.keys))
+        elif action == tk.SCROLL:
+            step = self.height if unit == tk.PAGES else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def _on_wheel(self, event):
+        self.scroll_to(self.top - (event.delta // 120) * 3)
+        return "break"
+
+    def _on_resize(self, event):
+        # Keep the window size in sync with how many rows actually fit on screen
+        row_height = max(self.listbox.winfo_reqheight() // max(int(self.listbox.cget("height")), 1), 1)
+        height = max(event.height // row_height, 1)
+        if height != self.height:
+            self.height = height
+            self.redraw()